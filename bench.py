@@ -0,0 +1,184 @@
+"""Benchmark suite for ExpressionEvaluator and BigNumber.
+
+Each case is run repeatedly. The suite reports throughput, latency
+percentiles and peak traced memory. Results can be saved as a JSON
+baseline and compared against a later run:
+
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json
+
+A case whose median latency rises by more than --threshold (default 10%)
+compared to the baseline counts as a regression. The script then exits
+with status 1.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import test
+from test import BigNumber, ExpressionCache, ExpressionEvaluator
+
+
+BIG = '7' * 999 + '.' + '3' * 1000
+NAMES = [chr(c) for c in range(ord('a'), ord('z') + 1) if chr(c) != 'e']
+
+
+def _clear_memos():
+    """Forget memoized function results and constants, so a run computes them"""
+    test._memo_unary.cache_clear()
+    test._pi.cache_clear()
+    test._e.cache_clear()
+
+
+def _cases():
+    """(name, expression, variables, cold) tuples; cold cases clear the
+    function memos before every run so they time the computation itself"""
+    evaluator = ExpressionEvaluator()
+    cases = [
+        ('short_arithmetic', '2+3*4-(1+2)/5', {}, False),
+        ('deep_nesting', '(' * 500 + '1+1' + ')' * 500, {}, False),
+        ('long_chain', '+'.join(f'{i}*{i % 7 + 1}' for i in range(2000)), {}, False),
+        ('digits_1000_add', f'{BIG}+{BIG}-{BIG}', {}, False),
+        ('digits_1000_mul_div', f'{BIG}*{BIG}/{BIG}', {}, False),
+        ('variables', '+'.join(f'{NAMES[i % len(NAMES)]}*{i}' for i in range(500)),
+         {name: f'{i}.5' for i, name in enumerate(NAMES)}, False),
+    ]
+    for name in evaluator.functions:
+        cases.append((f'function_{name}', f'{name}(0.5)', {}, True))
+    # Repeated calls on the same argument and precision, served from the memo.
+    cases.append(('memo_hit_sin_log_exp', 'sin(0.5)+log(0.5)+exp(0.5)', {}, False))
+    return cases
+
+
+def _percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def _measure(func, min_time, min_runs):
+    func()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < min_runs or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    total = sum(samples)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    return {
+        'runs': len(samples),
+        'ops_per_sec': len(samples) / total,
+        'p50_ms': _percentile(samples, 50) * 1000,
+        'p90_ms': _percentile(samples, 90) * 1000,
+        'p99_ms': _percentile(samples, 99) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def run_suite(min_time, min_runs, use_cache, only=None):
+    results = {}
+    for name, expression, variables, cold in _cases():
+        for show_steps in (False, True):
+            case = f'{name}[steps={"on" if show_steps else "off"}]'
+            if only and only not in case:
+                continue
+            cache = None if use_cache else ExpressionCache(0)
+            evaluator = ExpressionEvaluator(cache=cache)
+            for var, value in variables.items():
+                evaluator.set_variable(var, value)
+
+            if show_steps:
+                def func(expression=expression, evaluator=evaluator, cold=cold):
+                    if cold:
+                        _clear_memos()
+                    list(evaluator.evaluate(expression, show_steps=True)['steps'])
+            else:
+                def func(expression=expression, evaluator=evaluator, cold=cold):
+                    if cold:
+                        _clear_memos()
+                    evaluator.evaluate(expression)
+            results[case] = _measure(func, min_time, min_runs)
+            _print_row(case, results[case])
+
+    for name, func in (
+        ('bignumber_parse', lambda: BigNumber(BIG)),
+        ('bignumber_to_string', lambda b=BigNumber(BIG): b.to_string()),
+    ):
+        if only and only not in name:
+            continue
+        results[name] = _measure(func, min_time, min_runs)
+        _print_row(name, results[name])
+    return results
+
+
+def _print_row(case, r):
+    print(f"{case:<40} {r['ops_per_sec']:>12.1f}/s  p50 {r['p50_ms']:>9.3f}ms  "
+          f"p90 {r['p90_ms']:>9.3f}ms  p99 {r['p99_ms']:>9.3f}ms  peak {r['peak_kib']:>9.1f}KiB")
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} (p50, threshold {threshold:.0%}):")
+    for case, r in results.items():
+        old = baseline['results'].get(case)
+        if old is None:
+            continue
+        change = r['p50_ms'] / old['p50_ms'] - 1 if old['p50_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(case)
+        print(f"{case:<40} {old['p50_ms']:>9.3f}ms -> {r['p50_ms']:>9.3f}ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds to spend per case')
+    parser.add_argument('--min-runs', type=int, default=20, help='minimum runs per case')
+    parser.add_argument('--no-cache', action='store_true', help='disable the compiled expression cache')
+    parser.add_argument('--only', help='only run cases whose name contains this text')
+    parser.add_argument('--save', metavar='PATH', help='write results to a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed p50 slowdown')
+    args = parser.parse_args()
+
+    results = run_suite(args.min_time, args.min_runs, not args.no_cache, args.only)
+    report = {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'cache': not args.no_cache,
+        'results': results,
+    }
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Concurrency stress benchmark for a shared ExpressionEvaluator.
+
+Every expression is evaluated serially first to get the expected result
+and step trace. The same workload then runs on a thread pool that shares
+one evaluator, with each task using its own precision and step setting.
+Any result or trace that differs from the serial run counts as a
+mismatch, and the script exits with status 1 if there are any.
+
+Usage: python bench_concurrency.py [--threads N] [--rounds N]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from test import ExpressionEvaluator
+
+
+EXPRESSIONS = [
+    '2+3*4-(1+2)',
+    '-(2+3)*sqrt(4)',
+    '1/3+1/7',
+    '2^200-1',
+    'x*(y+1)^2',
+    'sqrt(2)*log(3)',
+    '((1+2)*(3+4))/(5-6)',
+    'floor(x/y)+ceil(y/x)',
+    'exp(1)-e',
+    '1/0',
+]
+
+PRECISIONS = [16, 50, 200]
+
+
+def build_tasks(rounds):
+    tasks = []
+    for r in range(rounds):
+        for i, expr in enumerate(EXPRESSIONS):
+            precision = PRECISIONS[(r + i) % len(PRECISIONS)]
+            show_steps = (r + i) % 2 == 0
+            tasks.append((expr, precision, show_steps))
+    return tasks
+
+
+def run(threads, rounds):
+    evaluator = ExpressionEvaluator()
+    evaluator.set_variable('x', '7')
+    evaluator.set_variable('y', '3')
+
+    tasks = build_tasks(rounds)
+    expected = {}
+    for expr, precision, show_steps in tasks:
+        key = (expr, precision, show_steps)
+        if key not in expected:
+            expected[key] = evaluator.evaluate(expr, show_steps=show_steps, precision=precision)
+
+    def work(task):
+        expr, precision, show_steps = task
+        return task, evaluator.evaluate(expr, show_steps=show_steps, precision=precision)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(work, tasks))
+    elapsed = time.perf_counter() - start
+
+    mismatches = [(task, got) for task, got in results if got != expected[task]]
+
+    print(f"threads:     {threads}")
+    print(f"evaluations: {len(tasks)}")
+    print(f"elapsed:     {elapsed:.3f}s")
+    print(f"throughput:  {len(tasks) / elapsed:.1f} evals/s")
+    print(f"mismatches:  {len(mismatches)}")
+    for (expr, precision, show_steps), got in mismatches[:5]:
+        print(f"  {expr!r} precision={precision} show_steps={show_steps}: {got!r}")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.threads, args.rounds) else 1)
+
+
+if __name__ == '__main__':
+    main()
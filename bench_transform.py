@@ -0,0 +1,78 @@
+"""Scaling benchmark for the text transformer in src/app/api/text/transform.py.
+
+For each input size (in characters), this times transform() on ASCII text and on text
+that mixes in non-ASCII characters. Inputs up to --legacy-max are also
+timed with the original per-character += loop. Their output is checked
+to be byte-for-byte identical.
+
+Usage: python bench_transform.py [--max-mb 100] [--legacy-max-mb 10]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'app', 'api', 'text'))
+
+from transform import transform  # noqa: E402
+
+
+ASCII_SAMPLE = 'The quick brown fox jumps over the lazy dog. '
+UNICODE_SAMPLE = 'Straße naïve café ǆ Σσς — ﬁne. '
+
+
+def legacy_transform(input_text):
+    transformed_text = ""
+    for char in input_text:
+        if char == ' ':
+            transformed_text += '     '
+        else:
+            transformed_text += char.upper() + '  '
+    return transformed_text
+
+
+def make_text(sample, size):
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def timed(func, text):
+    start = time.perf_counter()
+    result = func(text)
+    return time.perf_counter() - start, result
+
+
+def sizes(max_bytes):
+    """1 KB, 10 KB, ... up to max_bytes"""
+    size = 1000
+    while size <= max_bytes:
+        yield size
+        size *= 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-mb', type=float, default=100)
+    parser.add_argument('--legacy-max-mb', type=float, default=10)
+    args = parser.parse_args()
+
+    max_bytes = int(args.max_mb * 1000 * 1000)
+    legacy_max = int(args.legacy_max_mb * 1000 * 1000)
+
+    print(f"{'input':<8} {'size':>10} {'transform':>12} {'MB/s':>9} {'legacy':>12} {'speedup':>8}")
+    for name, sample in (('ascii', ASCII_SAMPLE), ('unicode', UNICODE_SAMPLE)):
+        for size in sizes(max_bytes):
+            text = make_text(sample, size)
+            elapsed, result = timed(transform, text)
+            row = f"{name:<8} {size:>10} {elapsed:>11.4f}s {size / elapsed / 1e6:>9.1f}"
+            if size <= legacy_max:
+                legacy_elapsed, expected = timed(legacy_transform, text)
+                if result != expected:
+                    print(f"MISMATCH for {name} input of {size} characters")
+                    sys.exit(1)
+                row += f" {legacy_elapsed:>11.4f}s {legacy_elapsed / elapsed:>7.1f}x"
+            print(row)
+            del text, result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Request metrics for the FastAPI app, exposed in the Prometheus text format.
+
+MetricsMiddleware records, per method and route template, a latency
+histogram, request and response byte counters, request counts by status
+and error counts, plus a gauge of requests in flight. Handlers can time
+their own phases with phase() or observe_phase(). render() produces the
+/metrics body; no client library is needed.
+"""
+import time
+import threading
+import contextlib
+from bisect import bisect_left
+
+# Upper bounds in seconds; the implicit last bucket is +Inf.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Requests that match no route share one label, so unknown paths cannot
+# grow the label set without bound.
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), label_values + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter, or a gauge when created with kind='gauge'"""
+
+    def __init__(self, name, help, labels=(), kind='counter'):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.kind = kind
+        self._series = {}
+
+    def inc(self, label_values=(), amount=1):
+        self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def set(self, label_values, value):
+        self._series[label_values] = value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+_lock = threading.Lock()
+_route = ('method', 'route')
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route', _route)
+REQUESTS = Counter('http_requests_total', 'Requests by route and status', _route + ('status',))
+REQUEST_BYTES = Counter('http_request_bytes_total', 'Request body bytes received', _route)
+RESPONSE_BYTES = Counter('http_response_bytes_total', 'Response body bytes sent', _route)
+ERRORS = Counter('http_request_errors_total', 'Requests that raised or returned a 5xx', _route)
+IN_FLIGHT = Counter('http_requests_in_flight', 'Requests being served', kind='gauge')
+PHASE_LATENCY = Histogram('phase_duration_seconds', 'Time spent in named handler phases', ('phase',))
+_METRICS = [REQUEST_LATENCY, REQUESTS, REQUEST_BYTES, RESPONSE_BYTES, ERRORS, IN_FLIGHT, PHASE_LATENCY]
+
+
+def register(metric):
+    """Add a Histogram or Counter to the /metrics output"""
+    with _lock:
+        _METRICS.append(metric)
+    return metric
+
+
+def observe_phase(name, seconds):
+    with _lock:
+        PHASE_LATENCY.observe((name,), seconds)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time the enclosed block as phase `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(name, time.perf_counter() - start)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        lines = []
+        for metric in _METRICS:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records request metrics.
+
+    It is a plain ASGI wrapper rather than a BaseHTTPMiddleware, so
+    streamed bodies pass through untouched; bytes are counted as the
+    receive and send messages go by. The route label is the matched
+    route's path template, which FastAPI leaves in the scope.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        state = {'status': 500, 'received': 0, 'sent': 0}
+
+        async def counting_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                state['received'] += len(message.get('body', b''))
+            return message
+
+        async def counting_send(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                state['sent'] += len(message.get('body', b''))
+            await send(message)
+
+        with _lock:
+            IN_FLIGHT.inc()
+        start = time.perf_counter()
+        failed = False
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get('route')
+            key = (scope['method'], getattr(route, 'path', UNMATCHED_ROUTE))
+            with _lock:
+                IN_FLIGHT.inc(amount=-1)
+                REQUEST_LATENCY.observe(key, elapsed)
+                REQUESTS.inc(key + (str(state['status']),))
+                REQUEST_BYTES.inc(key, state['received'])
+                RESPONSE_BYTES.inc(key, state['sent'])
+                if failed or state['status'] >= 500:
+                    ERRORS.inc(key)
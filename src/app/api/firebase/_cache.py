@@ -0,0 +1,153 @@
+"""
+In-process read-through cache for Firestore reads made by get.py.
+
+Entries expire after a TTL and the least recently used ones are evicted
+beyond a fixed size. add.py and delete.py invalidate what they write, so
+a process that serves both reads and writes never returns its own stale
+data; writes from other processes are bounded by the TTL.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_TTL = float(os.getenv('FIRESTORE_CACHE_TTL', 30))
+DEFAULT_MAXSIZE = int(os.getenv('FIRESTORE_CACHE_SIZE', 1024))
+
+# Returned by get() when there is no usable entry; None is a cached
+# "document not found".
+MISSING = object()
+
+
+def doc_key(collection, doc_id, fields=()):
+    return ('doc', collection, doc_id, tuple(fields))
+
+
+def list_key(collection, params):
+    return ('list', collection, tuple(sorted(params.items())))
+
+
+def _lineage(collection):
+    """The collection path and the paths of the collections above it"""
+    parts = collection.split('/')
+    return ['/'.join(parts[:i]) for i in range(len(parts), 0, -2)]
+
+
+class DocumentCache:
+    """Thread-safe TTL + LRU cache of documents and list pages.
+
+    Keys come from doc_key and list_key. Each collection has a
+    generation number that invalidate() bumps; a value loaded before an
+    invalidation of its collection, or of one above it, is not stored
+    afterwards, so a read racing a write cannot put the old data back.
+    A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, collection):
+        with self._lock:
+            return self._generation(collection)
+
+    def _generation(self, collection):
+        return tuple(self._generations.get(name, 0) for name in _lineage(collection))
+
+    def put(self, key, value, generation):
+        """Store value unless key's collection was invalidated since `generation`"""
+        with self._lock:
+            if self.maxsize <= 0 or self._generation(key[1]) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, load, bypass=False):
+        """Cached value for key, calling load() on a miss.
+
+        Returns (value, status) with status 'HIT', 'MISS' or 'BYPASS'. A
+        bypass skips the lookup but still stores the fresh value.
+        """
+        if not bypass:
+            value = self.get(key)
+            if value is not MISSING:
+                return value, 'HIT'
+        generation = self.generation(key[1])
+        value = load()
+        self.put(key, value, generation)
+        return value, 'BYPASS' if bypass else 'MISS'
+
+    def invalidate(self, collection, doc_ids=None):
+        """Drop cached reads that a write to collection may have changed.
+
+        With doc_ids only those documents and the collection's list pages
+        go; without, everything in the collection and in collections
+        nested under it (subcollections deleted recursively) goes.
+        """
+        doc_ids = None if doc_ids is None else set(doc_ids)
+        nested = collection + '/'
+        with self._lock:
+            stale = []
+            for key in self._entries:
+                if key[1] == collection:
+                    if doc_ids is None or key[0] == 'list' or key[2] in doc_ids:
+                        stale.append(key)
+                elif doc_ids is None and key[1].startswith(nested):
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.expirations = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by the handlers in this process.
+document_cache = DocumentCache()
@@ -0,0 +1,137 @@
+"""
+Shared Firestore client for the firebase handlers.
+
+The Firebase Admin SDK is imported and initialised on the first call to
+get_db() rather than at import time. The client is then kept for the
+life of the process, so warm invocations reuse its gRPC channel. Each
+cold start phase is timed and reported once: as a log line on stderr and
+as a Server-Timing header on the first response.
+"""
+import os
+import sys
+import json
+import time
+import random
+import threading
+import contextlib
+
+# Cold start phases in the order they run.
+PHASES = ('import', 'credential_parse', 'app_init', 'client_init', 'first_rpc')
+
+# Firestore rejects a batched write with more than 500 operations.
+BATCH_SIZE = 500
+# Batches committed at once, and retries for a batch that hits contention.
+BULK_WORKERS = 4
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 5.0
+
+_lock = threading.Lock()
+_db = None
+_metrics = {}
+_reported = False
+
+
+def _timed(phase, start):
+    now = time.perf_counter()
+    _metrics[phase] = (now - start) * 1000
+    return now
+
+
+def _init():
+    start = time.perf_counter()
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    from dotenv import load_dotenv
+    start = _timed('import', start)
+
+    load_dotenv()
+    if not firebase_admin._apps:
+        # For Vercel, use service account key from environment
+        service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
+        if service_account_key:
+            cred = credentials.Certificate(json.loads(service_account_key))
+        else:
+            # Fallback to default credentials (for local development)
+            cred = credentials.ApplicationDefault()
+        start = _timed('credential_parse', start)
+
+        firebase_admin.initialize_app(cred)
+        start = _timed('app_init', start)
+
+    db = firestore.client()
+    _timed('client_init', start)
+    return db
+
+
+def get_db():
+    """The process-wide Firestore client, created on first use"""
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                _db = _init()
+    return _db
+
+
+@contextlib.contextmanager
+def rpc():
+    """Wrap a Firestore call so the first one in the process is timed.
+
+    The first RPC pays for opening the channel and fetching an access
+    token, so it is reported as its own cold start phase.
+    """
+    if 'first_rpc' in _metrics:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.setdefault('first_rpc', (time.perf_counter() - start) * 1000)
+
+
+def _is_retryable(error):
+    from google.api_core import exceptions
+    return isinstance(error, (exceptions.Aborted, exceptions.DeadlineExceeded,
+                              exceptions.ResourceExhausted, exceptions.ServiceUnavailable))
+
+
+def commit_batch(batch):
+    """Commit a batched write, retrying on contention or overload.
+
+    A batch is atomic, so it is retried as a whole with exponential
+    backoff and jitter, up to MAX_ATTEMPTS times. Errors that are not
+    transient, and the last transient one, are raised.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            with rpc():
+                return batch.commit()
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            time.sleep(random.uniform(delay / 2, delay))
+
+
+def cold_start_metrics():
+    """Milliseconds spent in each cold start phase that has run so far"""
+    return {phase: round(_metrics[phase], 3) for phase in PHASES if phase in _metrics}
+
+
+def json_headers():
+    """Response headers for the handlers.
+
+    The first response after the first RPC carries the cold start phases
+    as a Server-Timing header, and the same numbers are logged to stderr.
+    """
+    global _reported
+    headers = {'Content-Type': 'application/json'}
+    if _reported or 'first_rpc' not in _metrics:
+        return headers
+    _reported = True
+    metrics = cold_start_metrics()
+    headers['Server-Timing'] = ', '.join(f'{phase};dur={ms}' for phase, ms in metrics.items())
+    print(json.dumps({'event': 'firestore_cold_start', **metrics}), file=sys.stderr)
+    return headers
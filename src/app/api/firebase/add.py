@@ -1,58 +1,195 @@
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
-from dotenv import load_dotenv
+import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables
-load_dotenv()
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _client import BATCH_SIZE, BULK_WORKERS, commit_batch, get_db, json_headers, rpc  # noqa: E402
+from _cache import document_cache  # noqa: E402
 
-# Initialize Firebase Admin SDK
-if not firebase_admin._apps:
-    service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-    if service_account_key:
-        import json as json_lib
-        cred = credentials.Certificate(json_lib.loads(service_account_key))
-    else:
-        cred = credentials.ApplicationDefault()
+MAX_DOCUMENTS = 10000
 
-    firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+def parse_body(body):
+    """Decode a request body that is JSON or, for bulk writes, NDJSON.
+
+    NDJSON comes back as a list with one entry per line; lines that fail
+    to parse are kept as JSONDecodeError entries so they can be reported
+    in place. A body is only taken as NDJSON when it has several lines and
+    the first parses on its own, so a malformed multi-line document is
+    reported as invalid JSON rather than written line by line.
+    """
+    try:
+        return json.loads(body)
+    except json.JSONDecodeError as error:
+        lines = [line for line in body.splitlines() if line.strip()]
+        if len(lines) < 2:
+            raise
+        try:
+            json.loads(lines[0])
+        except json.JSONDecodeError:
+            raise error from None
+    documents = []
+    for line in lines:
+        try:
+            documents.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            documents.append(e)
+    return documents
+
+
+def bulk_documents(data):
+    """Documents of a bulk request: a JSON array, a {"documents": [...]}
+    object or NDJSON. None for a single-document request."""
+    if isinstance(data, dict) and isinstance(data.get('documents'), list):
+        return data['documents']
+    if isinstance(data, list):
+        return data
+    return None
+
+
+def _document_error(document):
+    if isinstance(document, json.JSONDecodeError):
+        return f"Invalid JSON: {str(document)}"
+    if not isinstance(document, dict) or not document:
+        return "Document must be a non-empty JSON object"
+    doc_id = document.get('id')
+    if doc_id is not None and (not isinstance(doc_id, str) or not doc_id or '/' in doc_id):
+        return "id must be a non-empty string without '/'"
+    return None
+
+
+def _commit(db, collection_ref, chunk):
+    """Write one chunk of (index, document) pairs in a single batch and
+    return per-document results; see commit_batch for retries."""
+    batch = db.batch()
+    results = []
+    for index, document in chunk:
+        data = dict(document)
+        doc_id = data.pop('id', None)
+        if doc_id:
+            # Update existing document
+            batch.set(collection_ref.document(doc_id), data, merge=True)
+        else:
+            # The ID is generated here, so set() rather than create() keeps
+            # a retry of a commit that did land from failing as a duplicate.
+            doc_ref = collection_ref.document()
+            batch.set(doc_ref, data)
+            doc_id = doc_ref.id
+        results.append({'index': index, 'id': doc_id})
+
+    try:
+        commit_batch(batch)
+    except Exception as e:
+        return [{'index': r['index'], 'id': r['id'], 'error': str(e)} for r in results]
+    return results
+
+
+def bulk_write(db, collection, documents):
+    """Write many documents through batched writes of up to BATCH_SIZE.
+
+    Documents with an "id" are merged into that document, the rest are
+    created with a generated ID. Batches are committed in parallel on
+    BULK_WORKERS threads. Results come back in request order, one per
+    document, each with its index and either the ID or an error.
+    """
+    collection_ref = db.collection(collection)
+    results = [None] * len(documents)
+    valid = []
+    for index, document in enumerate(documents):
+        error = _document_error(document)
+        if error:
+            results[index] = {'index': index, 'error': error}
+        else:
+            valid.append((index, document))
+
+    chunks = [valid[i:i + BATCH_SIZE] for i in range(0, len(valid), BATCH_SIZE)]
+    try:
+        with ThreadPoolExecutor(max_workers=BULK_WORKERS) as pool:
+            for chunk_results in pool.map(lambda chunk: _commit(db, collection_ref, chunk), chunks):
+                for result in chunk_results:
+                    results[result['index']] = result
+    finally:
+        document_cache.invalidate(collection, [document.get('id') for _, document in valid])
+    return results
+
+
+def bulk_response(collection, documents):
+    if not documents:
+        return {
+            'statusCode': 400,
+            'body': '{"error": "Request body is required"}',
+            'headers': json_headers()
+        }
+    if len(documents) > MAX_DOCUMENTS:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f"At most {MAX_DOCUMENTS} documents per request"}),
+            'headers': json_headers()
+        }
+
+    results = bulk_write(get_db(), collection, documents)
+    failed = sum(1 for r in results if 'error' in r)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'results': results,
+            'written': len(results) - failed,
+            'failed': failed,
+            'collection': collection
+        }),
+        'headers': json_headers()
+    }
+
 
 def handler(event, context):
     """
     Vercel serverless function handler for adding/updating Firebase data.
-    Expected body: JSON with data to add/update
+    Expected body: JSON with data to add/update, or many documents for a
+    bulk write (see bulk_documents and bulk_write)
     Query parameters: collection (optional, defaults to 'data'), data_id (optional for updates)
     """
     try:
         # Get request body
         body = event.get('body', '{}')
         if isinstance(body, str):
-            data = json.loads(body)
+            data = parse_body(body)
         else:
             data = body or {}
 
+        documents = bulk_documents(data)
+        if documents is not None:
+            query_params = event.get('queryStringParameters', {}) or {}
+            return bulk_response(query_params.get('collection', 'data'), documents)
+
         if not data:
             return {
                 'statusCode': 400,
                 'body': '{"error": "Request body is required"}',
-                'headers': {'Content-Type': 'application/json'}
+                'headers': json_headers()
             }
 
         query_params = event.get('queryStringParameters', {}) or {}
         collection = query_params.get('collection', 'data')
         data_id = query_params.get('data_id')
+        db = get_db()
 
         if data_id:
             # Update existing document
             doc_ref = db.collection(collection).document(data_id)
-            doc_ref.set(data, merge=True)
+            try:
+                with rpc():
+                    doc_ref.set(data, merge=True)
+            finally:
+                document_cache.invalidate(collection, [data_id])
             message = f"Document {data_id} updated successfully"
         else:
             # Add new document
-            doc_ref = db.collection(collection).add(data)
+            try:
+                with rpc():
+                    doc_ref = db.collection(collection).add(data)
+            finally:
+                document_cache.invalidate(collection, [])
             data_id = doc_ref[1].id
             message = f"Document added successfully with ID: {data_id}"
 
@@ -63,18 +200,18 @@ def handler(event, context):
                 'id': data_id,
                 'collection': collection
             }),
-            'headers': {'Content-Type': 'application/json'}
+            'headers': json_headers()
         }
 
     except json.JSONDecodeError:
         return {
             'statusCode': 400,
             'body': '{"error": "Invalid JSON in request body"}',
-            'headers': {'Content-Type': 'application/json'}
+            'headers': json_headers()
         }
     except Exception as e:
         return {
             'statusCode': 500,
             'body': f'{{"error": "Failed to save data: {str(e)}"}}',
-            'headers': {'Content-Type': 'application/json'}
+            'headers': json_headers()
         }
\ No newline at end of file
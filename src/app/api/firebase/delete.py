@@ -1,30 +1,195 @@
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Initialize Firebase Admin SDK
-if not firebase_admin._apps:
-    # For Vercel, use service account key from environment
-    service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-    if service_account_key:
-        import json
-        cred = credentials.Certificate(json.loads(service_account_key))
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _client import BATCH_SIZE, BULK_WORKERS, commit_batch, get_db, json_headers, rpc  # noqa: E402
+from _cache import document_cache  # noqa: E402
+
+MAX_IDS = 10000
+_OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'in', 'not-in',
+              'array-contains', 'array-contains-any')
+# Firestore orders a query by the fields these filter on, so a cursor
+# taken from one of its snapshots must carry those fields.
+_INEQUALITIES = ('!=', '<', '<=', '>', '>=', 'not-in')
+
+
+class BadRequest(ValueError):
+    """Invalid delete request; reported as a 400 response"""
+
+
+def _flag(query_params, name):
+    return str(query_params.get(name, '')).lower() in ('1', 'true', 'yes')
+
+
+def _parse_ids(doc_ids):
+    if not isinstance(doc_ids, list) or not doc_ids:
+        raise BadRequest("ids must be a non-empty array")
+    if len(doc_ids) > MAX_IDS:
+        raise BadRequest(f"At most {MAX_IDS} IDs per request")
+    if not all(isinstance(doc_id, str) and doc_id and '/' not in doc_id for doc_id in doc_ids):
+        raise BadRequest("IDs must be non-empty strings without '/'")
+    return list(dict.fromkeys(doc_ids))
+
+
+def build_query(collection_ref, where):
+    """Query for a bulk delete filter: a list of [field, op, value] triples"""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    if not isinstance(where, list) or not where:
+        raise BadRequest("where must be a non-empty array of [field, op, value] filters")
+    query = collection_ref
+    for condition in where:
+        if not isinstance(condition, list) or len(condition) != 3 or condition[1] not in _OPERATORS:
+            raise BadRequest("Each filter must be [field, op, value] with op one of: " + ", ".join(_OPERATORS))
+        query = query.where(filter=FieldFilter(*condition))
+    return query
+
+
+def order_fields(where):
+    """Fields a filtered query is implicitly ordered by, besides the name"""
+    return list(dict.fromkeys(field for field, op, _ in where if op in _INEQUALITIES))
+
+
+def iter_matches(query, limit=None, page_size=BATCH_SIZE * BULK_WORKERS, fields=()):
+    """Yield the references of up to `limit` documents matching a query,
+    a page at a time.
+
+    Only document names and `fields` are fetched; fields must list what
+    the query is ordered by (see order_fields). Each page resumes after
+    the last snapshot of the previous one, which stays valid once that
+    document is deleted, so callers may delete a page before asking for
+    the next.
+    """
+    query = query.select(list(fields))
+    last = None
+    while limit is None or limit > 0:
+        size = page_size if limit is None else min(page_size, limit)
+        page = query.start_after(last) if last is not None else query
+        with rpc():
+            snapshots = list(page.limit(size).stream())
+        if not snapshots:
+            return
+        yield [snapshot.reference for snapshot in snapshots]
+        if len(snapshots) < size:
+            return
+        if limit is not None:
+            limit -= len(snapshots)
+        last = snapshots[-1]
+
+
+def count_tree(doc_ref):
+    """Number of documents under doc_ref, counting itself, via its subcollections"""
+    total = 1
+    with rpc():
+        subcollections = list(doc_ref.collections())
+    for subcollection in subcollections:
+        for refs in iter_matches(subcollection):
+            total += sum(count_tree(ref) for ref in refs)
+    return total
+
+
+def _delete_chunk(db, refs, recursive):
+    """Delete one chunk of references; returns (deleted, failures)"""
+    if recursive:
+        deleted = 0
+        failures = []
+        for ref in refs:
+            try:
+                with rpc():
+                    deleted += db.recursive_delete(ref)
+            except Exception as e:
+                failures.append({'id': ref.id, 'error': str(e)})
+        return deleted, failures
+
+    batch = db.batch()
+    for ref in refs:
+        batch.delete(ref)
+    try:
+        commit_batch(batch)
+    except Exception as e:
+        return 0, [{'id': ref.id, 'error': str(e)} for ref in refs]
+    return len(refs), []
+
+
+def bulk_delete(db, pages, recursive=False, dry_run=False):
+    """Delete every reference yielded by `pages`, a page at a time.
+
+    Each page is split into batched writes of up to BATCH_SIZE deletes,
+    committed on at most BULK_WORKERS threads. With `recursive`, each
+    document is removed with all of its subcollections via
+    recursive_delete instead. With `dry_run` nothing is deleted and the
+    documents that would be are only counted.
+    """
+    if dry_run:
+        matched = 0
+        for refs in pages:
+            matched += sum(count_tree(ref) for ref in refs) if recursive else len(refs)
+        return {'dry_run': True, 'matched': matched}
+
+    deleted = 0
+    failures = []
+    with ThreadPoolExecutor(max_workers=BULK_WORKERS) as pool:
+        for refs in pages:
+            chunks = [refs[i:i + BATCH_SIZE] for i in range(0, len(refs), BATCH_SIZE)]
+            if recursive:
+                # recursive_delete batches internally; spread documents over the workers.
+                chunks = [refs[i::BULK_WORKERS] for i in range(BULK_WORKERS) if refs[i::BULK_WORKERS]]
+            for chunk_deleted, chunk_failures in pool.map(
+                    lambda chunk: _delete_chunk(db, chunk, recursive), chunks):
+                deleted += chunk_deleted
+                failures.extend(chunk_failures)
+    return {'deleted': deleted, 'failed': failures}
+
+
+def bulk_response(db, collection, data, query_params):
+    """Response for a bulk delete of listed IDs or of every query match"""
+    collection_ref = db.collection(collection)
+    if query_params.get('data_ids') is not None:
+        doc_ids = [doc_id.strip() for doc_id in query_params['data_ids'].split(',') if doc_id.strip()]
     else:
-        # Fallback to default credentials (for local development)
-        cred = credentials.ApplicationDefault()
+        doc_ids = data.get('ids')
 
-    firebase_admin.initialize_app(cred)
+    if doc_ids is not None:
+        doc_ids = _parse_ids(doc_ids)
+        refs = [collection_ref.document(doc_id) for doc_id in doc_ids]
+        if _flag(query_params, 'dry_run'):
+            # Deleting a missing document is a no-op, so only count existing ones.
+            with rpc():
+                refs = [doc.reference for doc in db.get_all(refs, field_paths=[]) if doc.exists]
+        pages = (refs[i:i + BATCH_SIZE * BULK_WORKERS]
+                 for i in range(0, len(refs), BATCH_SIZE * BULK_WORKERS))
+    else:
+        limit = data.get('limit')
+        if limit is not None and (type(limit) is not int or limit < 1):
+            raise BadRequest("limit must be a positive integer")
+        query = build_query(collection_ref, data.get('where'))
+        pages = iter_matches(query, limit, fields=order_fields(data['where']))
+
+    recursive = _flag(query_params, 'recursive')
+    dry_run = _flag(query_params, 'dry_run')
+    try:
+        result = bulk_delete(db, pages, recursive, dry_run)
+    finally:
+        if not dry_run:
+            # Query and recursive deletes may touch anything under the collection.
+            document_cache.invalidate(collection, None if recursive else doc_ids)
+    result['collection'] = collection
+    return {
+        'statusCode': 200,
+        'body': json.dumps(result),
+        'headers': json_headers()
+    }
 
-db = firestore.client()
 
 def handler(event, context):
     """
     Vercel serverless function handler for deleting Firebase data.
     Expected query parameters: data_id, collection (optional, defaults to 'data')
+    Bulk deletes take data_ids (comma-separated) or a JSON body of
+    {"ids": [...]} or {"where": [[field, op, value], ...], "limit": n}.
+    recursive=true also deletes subcollections; dry_run=true only counts.
     """
     try:
         # Get query parameters
@@ -33,25 +198,51 @@ def handler(event, context):
         collection = query_params.get('collection', 'data')
 
         if not data_id:
+            body = event.get('body') or {}
+            data = json.loads(body) if isinstance(body, str) else body
+            if not isinstance(data, dict):
+                raise BadRequest("Request body must be a JSON object")
+            if data or query_params.get('data_ids') is not None:
+                return bulk_response(get_db(), collection, data, query_params)
             return {
                 'statusCode': 400,
                 'body': '{"error": "data_id parameter is required"}',
-                'headers': {'Content-Type': 'application/json'}
+                'headers': json_headers()
             }
 
+        if _flag(query_params, 'recursive') or _flag(query_params, 'dry_run'):
+            # Single document with its subcollections, or a count of them
+            return bulk_response(get_db(), collection, {'ids': [data_id]}, query_params)
+
         # Delete document from Firestore
-        doc_ref = db.collection(collection).document(data_id)
-        doc_ref.delete()
+        doc_ref = get_db().collection(collection).document(data_id)
+        try:
+            with rpc():
+                doc_ref.delete()
+        finally:
+            document_cache.invalidate(collection, [data_id])
 
         return {
             'statusCode': 200,
             'body': f'{{"message": "Document {data_id} deleted successfully from collection {collection}"}}',
-            'headers': {'Content-Type': 'application/json'}
+            'headers': json_headers()
         }
 
+    except json.JSONDecodeError:
+        return {
+            'statusCode': 400,
+            'body': '{"error": "Invalid JSON in request body"}',
+            'headers': json_headers()
+        }
+    except BadRequest as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': str(e)}),
+            'headers': json_headers()
+        }
     except Exception as e:
         return {
             'statusCode': 500,
             'body': f'{{"error": "Failed to delete document: {str(e)}"}}',
-            'headers': {'Content-Type': 'application/json'}
-        }
\ No newline at end of file
+            'headers': json_headers()
+        }
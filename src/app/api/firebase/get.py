@@ -1,72 +1,276 @@
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
-from dotenv import load_dotenv
+import sys
 import json
+import base64
+import binascii
 
-# Load environment variables
-load_dotenv()
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _client import get_db, json_headers, rpc  # noqa: E402
+from _cache import MISSING, doc_key, document_cache, list_key  # noqa: E402
 
-# Initialize Firebase Admin SDK
-if not firebase_admin._apps:
-    service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-    if service_account_key:
-        import json as json_lib
-        cred = credentials.Certificate(json_lib.loads(service_account_key))
+# Page size for list requests, and the most a caller may ask for.
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Most IDs accepted by one data_ids request.
+MAX_IDS = 500
+
+_DIRECTIONS = {'asc': 'ASCENDING', 'desc': 'DESCENDING'}
+# Query parameters that select which list page is returned.
+_LIST_PARAMS = ('limit', 'start_after', 'order_by', 'direction', 'select', 'format')
+
+
+class BadRequest(ValueError):
+    """Invalid query parameters; reported as a 400 response"""
+
+
+def encode_cursor(doc_id):
+    """Opaque start_after token for the page that follows `doc_id`"""
+    return base64.urlsafe_b64encode(doc_id.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        doc_id = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError):
+        doc_id = None
+    if not doc_id or '/' in doc_id:
+        raise BadRequest("Invalid start_after cursor")
+    return doc_id
+
+
+def _parse_limit(value):
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def _parse_fields(query_params):
+    return [f.strip() for f in query_params.get('select', '').split(',') if f.strip()]
+
+
+def _flag(query_params, name):
+    return str(query_params.get(name, '')).lower() in ('1', 'true', 'yes')
+
+
+def get_many(db, collection, doc_ids, fields=None, bypass=False):
+    """Fetch documents by ID in one get_all call, in request order.
+
+    Documents in the cache are served from it and only the rest are
+    fetched, unless `bypass` is set. get_all returns snapshots in no
+    particular order, so they are matched back up by ID. Missing
+    documents become {"id": ..., "error": "Document not found"} entries
+    in place. `fields` is an optional field mask. Returns the results
+    and a cache status of 'HIT', 'PARTIAL', 'MISS' or 'BYPASS'.
+    """
+    fields = fields or []
+    found = {}
+    wanted = []
+    for doc_id in dict.fromkeys(doc_ids):
+        data = MISSING if bypass else document_cache.get(doc_key(collection, doc_id, fields))
+        if data is MISSING:
+            wanted.append(doc_id)
+        else:
+            found[doc_id] = data
+
+    if wanted:
+        generation = document_cache.generation(collection)
+        collection_ref = db.collection(collection)
+        fetched = dict.fromkeys(wanted)
+        with rpc():
+            for doc in db.get_all([collection_ref.document(doc_id) for doc_id in wanted],
+                                  field_paths=fields or None):
+                if doc.exists:
+                    data = doc.to_dict()
+                    data['id'] = doc.id
+                    fetched[doc.id] = data
+        for doc_id, data in fetched.items():
+            document_cache.put(doc_key(collection, doc_id, fields), data, generation)
+        found.update(fetched)
+
+    if bypass:
+        status = 'BYPASS'
     else:
-        cred = credentials.ApplicationDefault()
+        status = 'MISS' if len(wanted) == len(found) else 'PARTIAL' if wanted else 'HIT'
+    return [found[doc_id] or {'id': doc_id, 'error': 'Document not found'}
+            for doc_id in doc_ids], status
+
+
+def _parse_ids(value):
+    doc_ids = [doc_id.strip() for doc_id in value.split(',') if doc_id.strip()]
+    if not doc_ids:
+        raise BadRequest("data_ids must list at least one ID")
+    if len(doc_ids) > MAX_IDS:
+        raise BadRequest(f"At most {MAX_IDS} IDs per request")
+    if any('/' in doc_id for doc_id in doc_ids):
+        raise BadRequest("IDs must not contain '/'")
+    return doc_ids
+
+
+def iter_page(db, collection, query_params):
+    """Yield one page of documents as dicts, then the next cursor (or None).
+
+    Documents are ordered by `order_by` (default: document ID) in
+    `direction` order, limited to `limit`, restricted to the
+    comma-separated `select` fields and resumed after the `start_after`
+    cursor. Each document is yielded as soon as it arrives, so callers
+    that serialise it straight away never hold more than one page.
+    """
+    limit = _parse_limit(query_params.get('limit'))
+    direction = _DIRECTIONS.get(query_params.get('direction', 'asc'))
+    if direction is None:
+        raise BadRequest("direction must be asc or desc")
+
+    collection_ref = db.collection(collection)
+    query = collection_ref.order_by(query_params.get('order_by') or '__name__', direction=direction)
+
+    fields = _parse_fields(query_params)
+    if fields:
+        query = query.select(fields)
+
+    token = query_params.get('start_after')
+    if token:
+        with rpc():
+            snapshot = collection_ref.document(decode_cursor(token)).get()
+        if not snapshot.exists:
+            raise BadRequest("start_after cursor refers to a deleted document")
+        query = query.start_after(snapshot)
+
+    # One extra document tells us whether there is a next page.
+    last_id = None
+    count = 0
+    with rpc():
+        for doc in query.limit(limit + 1).stream():
+            if count == limit:
+                yield encode_cursor(last_id)
+                return
+            data = doc.to_dict()
+            data['id'] = doc.id
+            last_id = doc.id
+            count += 1
+            yield data
+    yield None
+
+
+def list_response(db, collection, query_params):
+    """Response for a list request: a JSON array of one page, or NDJSON
+    when format=ndjson. The next page's cursor is sent in the
+    X-Next-Cursor header, and as a final {"next": ...} line for NDJSON.
+    Rendered pages are cached by collection and page parameters."""
+    ndjson = query_params.get('format') == 'ndjson'
+    if query_params.get('format') not in (None, 'json', 'ndjson'):
+        raise BadRequest("format must be json or ndjson")
 
-    firebase_admin.initialize_app(cred)
+    def load():
+        parts = []
+        next_cursor = None
+        for item in iter_page(db, collection, query_params):
+            if isinstance(item, dict):
+                parts.append(json.dumps(item))
+            else:
+                next_cursor = item
+        if ndjson:
+            parts.append(json.dumps({'next': next_cursor}))
+            return '\n'.join(parts) + '\n', next_cursor
+        return '[' + ', '.join(parts) + ']', next_cursor
+
+    key = list_key(collection, {name: query_params[name] for name in _LIST_PARAMS if name in query_params})
+    (body, next_cursor), status = document_cache.get_or_load(key, load, _flag(query_params, 'no_cache'))
+
+    headers = json_headers()
+    headers['X-Cache'] = status
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    if ndjson:
+        headers['Content-Type'] = 'application/x-ndjson'
+    return {'statusCode': 200, 'body': body, 'headers': headers}
 
-db = firestore.client()
 
 def handler(event, context):
     """
     Vercel serverless function handler for getting Firebase data.
     Expected query parameters: data_id, collection (optional, defaults to 'data')
-    If no data_id, returns all documents in collection
+    data_ids (comma-separated) fetches many documents at once; see get_many.
+    If no data_id, returns one page of the collection; see list_response.
+    List parameters: limit, start_after, order_by, direction, select, format
+    select (comma-separated fields) also applies to data_id and data_ids.
+    Reads are cached in-process (see _cache.py); no_cache=true skips the
+    cache for one request and cache_stats=true returns its hit ratio.
+    The X-Cache response header reports how a read was served.
     """
     try:
         query_params = event.get('queryStringParameters', {}) or {}
         data_id = query_params.get('data_id')
         collection = query_params.get('collection', 'data')
+        bypass = _flag(query_params, 'no_cache')
+
+        if _flag(query_params, 'cache_stats'):
+            return {
+                'statusCode': 200,
+                'body': json.dumps(document_cache.stats()),
+                'headers': json_headers()
+            }
 
-        if data_id:
+        db = get_db()
+
+        if query_params.get('data_ids') is not None:
+            # Get several documents by ID
+            doc_ids = _parse_ids(query_params['data_ids'])
+            results, status = get_many(db, collection, doc_ids, _parse_fields(query_params), bypass)
+            headers = json_headers()
+            headers['X-Cache'] = status
+            return {
+                'statusCode': 200,
+                'body': json.dumps(results),
+                'headers': headers
+            }
+        elif data_id:
             # Get specific document
-            doc_ref = db.collection(collection).document(data_id)
-            doc = doc_ref.get()
-            if doc.exists:
+            fields = _parse_fields(query_params)
+
+            def load():
+                doc_ref = db.collection(collection).document(data_id)
+                with rpc():
+                    doc = doc_ref.get(field_paths=fields or None)
+                if not doc.exists:
+                    return None
                 data = doc.to_dict()
                 data['id'] = doc.id
+                return data
+
+            data, status = document_cache.get_or_load(doc_key(collection, data_id, fields), load, bypass)
+            headers = json_headers()
+            headers['X-Cache'] = status
+            if data is not None:
                 return {
                     'statusCode': 200,
                     'body': json.dumps(data),
-                    'headers': {'Content-Type': 'application/json'}
+                    'headers': headers
                 }
             else:
                 return {
                     'statusCode': 404,
                     'body': '{"error": "Document not found"}',
-                    'headers': {'Content-Type': 'application/json'}
+                    'headers': headers
                 }
         else:
-            # Get all documents in collection
-            docs = db.collection(collection).stream()
-            data_list = []
-            for doc in docs:
-                data = doc.to_dict()
-                data['id'] = doc.id
-                data_list.append(data)
-
-            return {
-                'statusCode': 200,
-                'body': json.dumps(data_list),
-                'headers': {'Content-Type': 'application/json'}
-            }
+            # Get one page of documents in collection
+            return list_response(db, collection, query_params)
 
+    except BadRequest as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': str(e)}),
+            'headers': json_headers()
+        }
     except Exception as e:
         return {
             'statusCode': 500,
             'body': f'{{"error": "Failed to get data: {str(e)}"}}',
-            'headers': {'Content-Type': 'application/json'}
+            'headers': json_headers()
         }
\ No newline at end of file
@@ -1,12 +1,91 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-import os
-from dotenv import load_dotenv
+import time
 
+# Startup phases in milliseconds, logged once after the first request.
+# For a per-module breakdown, set PYTHONPROFILEIMPORTTIME=1 on the
+# function; Python then writes an -X importtime report to stderr.
+STARTUP_PHASES = {}
+_phase_start = time.perf_counter()
+
+
+def _phase(name, start=None):
+    """Record the time since `start`, or since the previous phase ended"""
+    global _phase_start
+    now = time.perf_counter()
+    STARTUP_PHASES[name] = round((now - (_phase_start if start is None else start)) * 1000, 3)
+    _phase_start = now
+
+
+from fastapi import FastAPI, HTTPException  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from fastapi.responses import PlainTextResponse  # noqa: E402
+from pydantic import BaseModel, Field  # noqa: E402
+from typing import Dict, List, Optional  # noqa: E402
+from contextlib import asynccontextmanager  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+
+# The expression evaluator lives in test.py at the repository root.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from test import DEFAULT_PRECISION, ExpressionEvaluator  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics  # noqa: E402
+
+_phase("imports")
+
+from dotenv import load_dotenv  # noqa: E402
 
 load_dotenv()
+_phase("dotenv")
+
+# Evaluations run on this many threads; the costly ones are handed on to
+# a pool of worker processes that can be killed when they overrun.
+EVAL_THREADS = int(os.getenv("EVAL_THREADS", 8))
+EVAL_PROCESSES = int(os.getenv("EVAL_PROCESSES", 2))
+DEFAULT_TIMEOUT = 10.0
+MAX_TIMEOUT = 30.0
+MAX_PRECISION = 10000
+MAX_EXPRESSION_LENGTH = 100000
+MAX_BATCH = 100
+# Step traces are rendered on the executor, never on the event loop. A
+# request without max_steps gets DEFAULT_MAX_STEPS, and rendering stops
+# once the steps add up to MAX_STEPS_CHARS, since each step can repeat
+# the whole expression.
+DEFAULT_MAX_STEPS = 1000
+MAX_STEPS = 10000
+MAX_STEPS_CHARS = 1000000
+
+# Created on the first evaluation so requests that never evaluate
+# anything do not pay for them.
+executor = None
+evaluation_pool = None
+_executor_lock = threading.Lock()
+
 
-app = FastAPI(title="MuizzNwali API", version="1.0.0")
+def _get_executor():
+    global executor, evaluation_pool
+    if executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        from test import EvaluationPool
+        with _executor_lock:
+            if executor is None:
+                evaluation_pool = EvaluationPool(max_workers=EVAL_PROCESSES, wall_time=DEFAULT_TIMEOUT)
+                executor = ThreadPoolExecutor(max_workers=EVAL_THREADS, thread_name_prefix="evaluate")
+    return executor
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        evaluation_pool.shutdown()
+
+
+app = FastAPI(title="MuizzNwali API", version="1.0.0", lifespan=lifespan)
 
 
 app.add_middleware(
@@ -16,6 +95,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(_metrics.MetricsMiddleware)
+
+STARTUP_GAUGE = _metrics.register(_metrics.Counter(
+    "startup_phase_milliseconds", "Cold start phases of this process", ("phase",), kind="gauge"))
+
 
 @app.get("/")
 async def root():
@@ -26,11 +110,143 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    for name, ms in STARTUP_PHASES.items():
+        STARTUP_GAUGE.set((name,), ms)
+    return PlainTextResponse(_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+class EvaluateRequest(BaseModel):
+    expression: str = Field(..., min_length=1, max_length=MAX_EXPRESSION_LENGTH)
+    precision: int = Field(DEFAULT_PRECISION, ge=1, le=MAX_PRECISION)
+    adaptive: bool = False
+    show_steps: bool = False
+    max_steps: Optional[int] = Field(None, ge=1, le=MAX_STEPS)
+    variables: Dict[str, str] = Field(default_factory=dict)
+    timeout: float = Field(DEFAULT_TIMEOUT, gt=0, le=MAX_TIMEOUT)
+
+
+class EvaluateResponse(BaseModel):
+    expression: str
+    result: Optional[str] = None
+    error: Optional[str] = None
+    steps: Optional[List[str]] = None
+    elapsed_ms: float
+
+
+class BatchEvaluateRequest(BaseModel):
+    items: List[EvaluateRequest] = Field(..., min_length=1, max_length=MAX_BATCH)
+
+
+class BatchEvaluateResponse(BaseModel):
+    results: List[EvaluateResponse]
+
+
+def _render_steps(steps, cancel):
+    """The steps as strings, up to MAX_STEPS_CHARS of them in total"""
+    rendered = []
+    size = 0
+    for step in steps:
+        if size >= MAX_STEPS_CHARS or cancel.is_set():
+            break
+        rendered.append(step)
+        size += len(step)
+    return rendered
+
+
+def _evaluate(request, cancel, submitted):
+    """Blocking evaluation, run on the executor.
+
+    Expressions whose estimated cost exceeds the pool's offload threshold
+    go to a worker process under the request's timeout, so they are killed
+    rather than left running once it passes. Step traces are rendered here
+    as well. Time spent queued for a thread, evaluating and rendering are
+    reported as separate phases.
+    """
+    _metrics.observe_phase("evaluate.queue", time.perf_counter() - submitted)
+    evaluator = ExpressionEvaluator(precision=request.precision, adaptive=request.adaptive)
+    for name, value in request.variables.items():
+        message = evaluator.set_variable(name, value)
+        if message.startswith("Error"):
+            return message
+    max_steps = request.max_steps or DEFAULT_MAX_STEPS
+    if evaluator.estimate_cost(request.expression) > evaluation_pool.offload_cost:
+        with _metrics.phase("evaluate.pool"):
+            result = evaluation_pool.run(request.expression, request.show_steps, request.precision,
+                                         request.adaptive, variables=evaluator.variables,
+                                         wall_time=request.timeout, cancel=cancel,
+                                         max_steps=max_steps)
+    else:
+        with _metrics.phase("evaluate.inprocess"):
+            result = evaluator.evaluate(request.expression, request.show_steps, max_steps=max_steps)
+    if isinstance(result, dict):
+        with _metrics.phase("evaluate.render_steps"):
+            result = {"result": result["result"], "steps": _render_steps(result["steps"], cancel)}
+    return result
+
+
+async def run_evaluation(request):
+    """Evaluate off the event loop and build the response model"""
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(
+            loop.run_in_executor(_get_executor(), _evaluate, request, cancel, start), request.timeout)
+    except asyncio.TimeoutError:
+        cancel.set()
+        result = "Error: Evaluation timed out"
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    response = EvaluateResponse(expression=request.expression, elapsed_ms=elapsed_ms)
+    if isinstance(result, dict):
+        response.result = result["result"]
+        response.steps = result["steps"]
+    elif result.startswith("Error"):
+        response.error = result
+    else:
+        response.result = result
+    return response
+
+
+@app.post("/evaluate", response_model=EvaluateResponse)
+async def evaluate(request: EvaluateRequest):
+    response = await run_evaluation(request)
+    if response.error == "Error: Evaluation timed out":
+        raise HTTPException(status_code=504, detail=response.error)
+    return response
+
+
+@app.post("/evaluate/batch", response_model=BatchEvaluateResponse)
+async def evaluate_batch(request: BatchEvaluateRequest):
+    results = await asyncio.gather(*(run_evaluation(item) for item in request.items))
+    return BatchEvaluateResponse(results=results)
+
+
+_phase("app")
+
+_adapter = None
+
+
 def handler(event, context):
-    
-    from mangum import Mangum
-    handler = Mangum(app)
-    return handler(event, context)
+    """Serverless entry point.
+
+    The Mangum adapter is built on the first invocation and reused by warm
+    ones. Its lifespan handling is off because Mangum would otherwise run
+    startup and shutdown around every single event.
+    """
+    global _adapter
+    if _adapter is None:
+        start = time.perf_counter()
+        from mangum import Mangum
+        _adapter = Mangum(app, lifespan="off")
+        _phase("adapter", start)
+        response = _adapter(event, context)
+        _phase("first_request")
+        print(json.dumps({"event": "startup", **STARTUP_PHASES}), file=sys.stderr)
+        return response
+    return _adapter(event, context)
 
 
 if __name__ == "__main__":
@@ -1,46 +1,440 @@
 import sys
 import json
+import os
+import re
+import codecs
+import functools
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+
+
+_SPACE_TO_NUL = bytes.maketrans(b' ', b'\x00')
+_WHITESPACE_RUN = re.compile(r'\s+')
+
+_CASES = {'upper': str.upper, 'lower': str.lower, 'none': None}
+_WHITESPACE_MODES = ('pad', 'preserve', 'collapse')
+_MAX_WIDTH = 64
+
+# Bytes read per step in streaming mode.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Batches with more characters than this are spread over a process pool.
+BATCH_POOL_THRESHOLD = 4 * 1024 * 1024
+
+
+class _RuleTable(dict):
+    """str.translate table for one rule set.
+
+    Entries are filled in the first time a character is seen, so the table
+    covers all of Unicode without being built up front; upper() may expand
+    a character (e.g. 'ß' -> 'SS'), which translate handles.
+    """
+
+    def __init__(self, rules):
+        super().__init__()
+        self.rules = rules
+
+    def __missing__(self, code):
+        rules = self.rules
+        char = chr(code)
+        if char in rules.mapping:
+            value = rules.mapping[char] + rules.padding
+        elif rules.whitespace == 'preserve' and char.isspace():
+            value = char
+        elif char == ' ':
+            value = ' ' * rules.space_width
+        else:
+            case = _CASES[rules.case]
+            value = (case(char) if case else char) + rules.padding
+        self[code] = value
+        return value
+
+
+class TransformRules:
+    """A transform rule set compiled once into a translation table.
+
+    Every character is cased and followed by `pad` spaces, a space becomes
+    `space_width` spaces, and `mapping` replaces single characters before
+    padding. `whitespace` is 'pad' (the above), 'preserve' (whitespace is
+    copied through unpadded) or 'collapse' (each whitespace run is padded
+    as one space). Build instances with compile_rules so equal configs
+    share one compiled table.
+    """
+    __slots__ = ('case', 'pad', 'space_width', 'whitespace', 'mapping', 'padding', '_table', '_ascii')
+
+    def __init__(self, case='upper', pad=2, space_width=5, whitespace='pad', mapping=()):
+        self.case = case
+        self.pad = pad
+        self.space_width = space_width
+        self.whitespace = whitespace
+        self.mapping = dict(mapping)
+        self.padding = ' ' * pad
+        self._table = _RuleTable(self)
+        # The bytes fast path only knows casing and padding.
+        self._ascii = not self.mapping and whitespace != 'preserve'
+
+    def _pad_ascii(self, data):
+        """Fast path for pure-ASCII bytes without NUL; returns a bytearray.
+
+        Cased bytes are written at a stride of pad + 1 into a preallocated
+        buffer of spaces, so each one is followed by the padding. Input
+        spaces are swapped for NUL first so a single replace() can resize
+        their padded form to space_width afterwards.
+        """
+        if self.case == 'upper':
+            data = data.upper()
+        elif self.case == 'lower':
+            data = data.lower()
+        stride = self.pad + 1
+        out = bytearray(b' ') * (stride * len(data))
+        out[0::stride] = data.translate(_SPACE_TO_NUL)
+        if self.space_width >= self.pad:
+            return out.replace(b'\x00', b' ' * (self.space_width - self.pad))
+        return out.replace(b'\x00' + b' ' * self.pad, b' ' * self.space_width)
+
+    def __call__(self, text):
+        if self.whitespace == 'collapse':
+            text = _WHITESPACE_RUN.sub(' ', text)
+        if self._ascii and text.isascii() and '\x00' not in text:
+            return self._pad_ascii(text.encode('ascii')).decode('ascii')
+        return text.translate(self._table)
+
+    def transform_bytes(self, data):
+        """Transform UTF-8 encoded bytes, with a fast path for pure-ASCII input"""
+        if (not self._ascii or self.whitespace == 'collapse'
+                or not data.isascii() or b'\x00' in data):
+            return self(data.decode('utf-8')).encode('utf-8')
+        return bytes(self._pad_ascii(data))
+
+
+@functools.lru_cache(maxsize=128)
+def _compile(case, pad, space_width, whitespace, mapping):
+    return TransformRules(case, pad, space_width, whitespace, mapping)
+
+
+def _width(config, key, default):
+    value = config.get(key, default)
+    if type(value) is not int or not 0 <= value <= _MAX_WIDTH:
+        raise ValueError(f"{key} must be an integer from 0 to {_MAX_WIDTH}")
+    return value
+
+
+def compile_rules(config=None):
+    """Compiled TransformRules for a rules object from a request.
+
+    Recognised keys are case ('upper', 'lower' or 'none'), pad,
+    space_width, whitespace ('pad', 'preserve' or 'collapse') and map
+    (single characters to replacement strings). The compiled form is
+    cached by the normalised config, so repeated requests with the same
+    rules reuse one table. Raises ValueError for an invalid config.
+    """
+    if not config:
+        return DEFAULT_RULES
+    if not isinstance(config, dict):
+        raise ValueError("rules must be an object")
+    unknown = set(config) - {'case', 'pad', 'space_width', 'whitespace', 'map'}
+    if unknown:
+        raise ValueError(f"unknown rule: {sorted(unknown)[0]}")
+
+    case = config.get('case', 'upper')
+    if case not in _CASES:
+        raise ValueError("case must be one of: " + ", ".join(_CASES))
+    whitespace = config.get('whitespace', 'pad')
+    if whitespace not in _WHITESPACE_MODES:
+        raise ValueError("whitespace must be one of: " + ", ".join(_WHITESPACE_MODES))
+    mapping = config.get('map') or {}
+    if not isinstance(mapping, dict) or not all(
+            len(k) == 1 and isinstance(v, str) for k, v in mapping.items()):
+        raise ValueError("map must map single characters to strings")
+
+    return _compile(case, _width(config, 'pad', 2), _width(config, 'space_width', 5),
+                    whitespace, tuple(sorted(mapping.items())))
+
+
+DEFAULT_RULES = _compile('upper', 2, 5, 'pad', ())
+
+
+def transform_bytes(data, rules=None):
+    """Transform UTF-8 encoded bytes, with a fast path for pure-ASCII input"""
+    return (rules or DEFAULT_RULES).transform_bytes(data)
+
+
+def transform(input_text, rules=None):
+    """Apply a compiled rule set to the text; by default uppercase every
+    character and pad it, and spaces become five spaces"""
+    return (rules or DEFAULT_RULES)(input_text)
+
+
+def handle_request(data):
+    """Build the response object for one decoded request"""
+    if not isinstance(data, dict):
+        return {"error": "Request must be a JSON object"}
+
+    input_text = data.get('text', '')
+
+    if not input_text:
+        return {"error": "text field is required"}
+
+    try:
+        rules = compile_rules(data.get('rules'))
+    except ValueError as e:
+        return {"error": f"Invalid rules: {str(e)}"}
+
+    transformed_text = transform(input_text, rules)
+
+    return {
+        'original': input_text,
+        'transformed': transformed_text,
+        'length': len(transformed_text)
+    }
+
+
+class _InvalidLine:
+    """Placeholder for an unparseable NDJSON line, reported in place"""
+    __slots__ = ('message',)
+
+    def __init__(self, message):
+        self.message = message
+
+
+def _batch_item(item, rules=None):
+    """Result for one batch entry; a bare string is shorthand for {"text": ...}.
+
+    `rules` is the batch-wide rules config, used when the entry has none.
+    """
+    if isinstance(item, _InvalidLine):
+        return {"error": item.message}
+    if isinstance(item, str):
+        item = {'text': item}
+    if rules and isinstance(item, dict) and 'rules' not in item:
+        item = dict(item, rules=rules)
+    try:
+        return handle_request(item)
+    except Exception as e:
+        return {"error": f"Failed to transform text: {str(e)}"}
+
+
+def _batch_size(items):
+    size = 0
+    for item in items:
+        text = item.get('text') if isinstance(item, dict) else item
+        if isinstance(text, str):
+            size += len(text)
+    return size
+
+
+def transform_batch(items, workers=None, rules=None):
+    """Results for a list of batch entries, in order.
+
+    Each entry is a string or a {"text": ...} object and gets its own
+    result, so one bad entry does not fail the batch. `rules` applies to
+    entries without a "rules" field of their own. Batches larger than
+    BATCH_POOL_THRESHOLD characters are split across a process pool unless
+    `workers` is 1; if processes cannot be started the batch runs inline.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(items) > 1 and _batch_size(items) > BATCH_POOL_THRESHOLD:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(items) // (workers * 4))
+                return list(pool.map(functools.partial(_batch_item, rules=rules),
+                                     items, chunksize=chunksize))
+        except (OSError, NotImplementedError):
+            pass
+    return [_batch_item(item, rules) for item in items]
+
+
+def handle_batch(data):
+    """Build the response for a batch request: a JSON array or {"texts": [...]}
+    with optional batch-wide "rules" for entries that carry none.
+    """
+    items = data['texts'] if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return {"error": "texts must be an array"}
+    rules = data.get('rules') if isinstance(data, dict) else None
+    results = transform_batch(items, rules=rules)
+    return {'results': results, 'count': len(results)}
+
+
+def _is_batch(data):
+    return isinstance(data, list) or (isinstance(data, dict) and 'texts' in data)
+
+
+def is_ndjson(input_data):
+    """Whether input that failed to parse as one JSON document is NDJSON:
+    several lines, the first of which is a JSON document on its own"""
+    lines = [line for line in input_data.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return False
+    try:
+        json.loads(lines[0])
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+def parse_ndjson(input_data):
+    """Decode NDJSON batch input; lines that fail to parse become error entries"""
+    items = []
+    for line in input_data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            items.append(_InvalidLine(f"Invalid JSON input: {str(e)}"))
+    return items
+
+
+def handle_line(line):
+    """Handle one NDJSON request line and return the encoded response line.
+
+    If the request carries an "id" it is echoed back so callers can
+    pipeline requests and match up the responses.
+    """
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        return json.dumps({"error": f"Invalid JSON input: {str(e)}", "id": None})
+
+    try:
+        result = handle_batch(data) if _is_batch(data) else handle_request(data)
+    except Exception as e:
+        result = {"error": f"Failed to transform text: {str(e)}"}
+
+    if isinstance(data, dict) and 'id' in data:
+        result['id'] = data['id']
+    return json.dumps(result)
+
+
+def serve_stdio(stdin=None, stdout=None):
+    """Long-lived worker: one JSON request per stdin line, one response line each"""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        if not line.strip():
+            continue
+        stdout.write(handle_line(line) + '\n')
+        stdout.flush()
+
+
+def iter_transform(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the transform of a binary UTF-8 stream one chunk at a time.
+
+    At most `chunk_size` bytes are read at once. An incremental decoder
+    carries multi-byte characters that straddle a chunk boundary over to
+    the next chunk.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        block = stream.read(chunk_size)
+        text = decoder.decode(block, final=not block)
+        if text:
+            yield transform(text)
+        if not block:
+            return
+
+
+def serve_stream(stdin=None, stdout=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Transform raw text from stdin with bounded memory, writing NDJSON records.
+
+    Each chunk of output is written as {"chunk": ...} as soon as it is
+    ready, followed by a trailing {"done": true, "length": ...} summary.
+    Failures are reported as an {"error": ...} record.
+    """
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout
+    length = 0
+    try:
+        for transformed in iter_transform(stdin, chunk_size):
+            length += len(transformed)
+            stdout.write(json.dumps({'chunk': transformed}) + '\n')
+            stdout.flush()
+    except Exception as e:
+        stdout.write(json.dumps({"error": f"Failed to transform text: {str(e)}"}) + '\n')
+        stdout.flush()
+        return
+
+    if not length:
+        stdout.write(json.dumps({"error": "No input received"}) + '\n')
+    else:
+        stdout.write(json.dumps({'done': True, 'length': length}) + '\n')
+    stdout.flush()
+
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode('utf-8')
+            if not line.strip():
+                continue
+            self.wfile.write((handle_line(line) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(path):
+    """Long-lived worker listening on a Unix socket, NDJSON framed like serve_stdio"""
+    if os.path.exists(path):
+        os.unlink(path)
+    with _UnixServer(path, _LineHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
 
 def main():
     """
     Standalone Python script for text transformation.
     Reads JSON from stdin and outputs transformed text to stdout.
+
+    Run with --serve to keep the process alive and answer newline-delimited
+    JSON requests on stdin, or with --socket PATH to answer them on a Unix
+    socket; see serve_stdio and serve_socket. --stream [CHUNK_SIZE]
+    transforms raw text from stdin in chunks; see serve_stream.
+
+    Batches are accepted as a JSON array, a {"texts": [...]} object or one
+    request per line (NDJSON); the response is {"results": [...]} in input
+    order with per-item errors. See transform_batch.
+
+    A request may carry a "rules" object selecting a transform variant
+    (casing, pad widths, whitespace handling, character map); see
+    compile_rules.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve_stdio()
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--stream':
+        chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CHUNK_SIZE
+        serve_stream(chunk_size=chunk_size)
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '--socket':
+        serve_socket(sys.argv[2])
+        return
+
     try:
-       
-        input_data = ""
-        for line in sys.stdin:
-            input_data += line
+
+        input_data = sys.stdin.read()
 
         if not input_data.strip():
             result = {"error": "No input received"}
             print(json.dumps(result))
             return
 
-       
-        data = json.loads(input_data.strip())
-        input_text = data.get('text', '')
-
-        if not input_text:
-            result = {"error": "text field is required"}
-            print(json.dumps(result))
-            return
 
-       
-        transformed_text = ""
-        for char in input_text:
-            if char == ' ':
-               
-                transformed_text += '     '
-            else:
-               
-                transformed_text += char.upper() + '  '
-
-        result = {
-            'original': input_text,
-            'transformed': transformed_text,
-            'length': len(transformed_text)
-        }
+        try:
+            data = json.loads(input_data.strip())
+        except json.JSONDecodeError:
+            # A malformed multi-line request is reported as such, not
+            # re-read as a batch of broken lines.
+            if not is_ndjson(input_data):
+                raise
+            data = parse_ndjson(input_data)
+        result = handle_batch(data) if _is_batch(data) else handle_request(data)
 
         print(json.dumps(result))
 
@@ -52,4 +446,4 @@ def main():
         print(json.dumps(result))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,96 +1,976 @@
 import re
 import decimal
+import functools
 import math
+import multiprocessing
+import signal
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
 from decimal import Decimal, InvalidOperation
 import cmath
+from array import array
 
+try:
+    import resource
+except ImportError:
+    resource = None
 
-decimal.getcontext().prec = 1000  
-decimal.getcontext().Emax = 1000000  
-decimal.getcontext().Emin = -1000000  
 
+# Evaluations run in their own local Decimal context; nothing here touches
+# the process-wide decimal context.
+DEFAULT_PRECISION = 1000
+_EMAX = 1000000
+_EMIN = -1000000
+# First working precision tried by adaptive evaluation.
+_ADAPTIVE_START = 32
+# Estimated cost (see CompiledExpression.estimate_cost) above which
+# solve_expression hands an expression to an EvaluationPool. One unit is
+# roughly 20ns; ln() at 1000 digits costs about 10**6.
+DEFAULT_OFFLOAD_COST = 2500000
+
+
+_OVERFLOW = Decimal('1e1000000')
+_INFINITY = Decimal('Infinity')
+
+# Context used for BigNumber <-> Decimal conversions; wide enough that
+# scaling an exact value never rounds it.
+_EXACT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+_NUMBER_TEXT_RE = re.compile(r'([+-]?)([0-9]*)(?:\.([0-9]*))?(?:[eE]([+-]?[0-9]+))?\Z')
 
-sbse = []
 
 class BigNumber:
-    def __init__(self, value=None, chunks=None, decimal_pos=None):
-        if value is not None:
-            if value == 'inf':
-                self.chunks = ['inf']
-                self.decimal_pos = None
-                return
-                
-            
-            if 'E' in value:
-                value = self._from_scientific(value)
-            
-            
-            if '.' in value:
-                integer_part, fractional_part = value.split('.')
-                self.decimal_pos = len(integer_part)
-                digits = integer_part + fractional_part
-            else:
-                self.decimal_pos = len(value)
-                digits = value
-                
-            
-            digits = digits.lstrip('0')
-            if not digits:
-                digits = '0'
-                self.decimal_pos = 1
-            else:
-                
-                self.decimal_pos = max(1, self.decimal_pos - (len(value) - len(digits)))
-                
-            
-            self.chunks = [digits[i:i+50] for i in range(0, len(digits), 50)]
+    """Exact decimal number stored as an integer mantissa and an exponent.
+
+    The value is mantissa * 10**exponent, so arithmetic on it never rounds
+    however many digits it has. Infinities are kept in `special` ('inf' or
+    '-inf') with a zero mantissa. BigNumber converts to and from int,
+    Decimal and numeric strings (including scientific notation), and
+    supports +, -, *, divmod, // and %, non-negative integer powers and
+    comparisons with other BigNumbers, ints and Decimals.
+    """
+
+    __slots__ = ('mantissa', 'exponent', 'special')
+
+    def __init__(self, value=None, mantissa=0, exponent=0):
+        self.special = None
+        if value is None:
+            self.mantissa = mantissa
+            self.exponent = exponent
+        elif isinstance(value, BigNumber):
+            self.mantissa = value.mantissa
+            self.exponent = value.exponent
+            self.special = value.special
+        elif isinstance(value, int):
+            self.mantissa = value
+            self.exponent = 0
+        elif isinstance(value, Decimal):
+            self._set_decimal(value)
         else:
-            self.chunks = chunks
-            self.decimal_pos = decimal_pos
-    
-    def _from_scientific(self, sci_str):
-        """Convert scientific notation to decimal string"""
-        if 'E' not in sci_str:
-            return sci_str
-            
-        num, exp = sci_str.split('E')
-        exp = int(exp)
-        
-        if '.' in num:
-            integer, fractional = num.split('.')
-            num = integer + fractional
-            exp -= len(fractional)
-        
-        if exp > 0:
-            num += '0' * exp
-        elif exp < 0:
-            if len(num) > -exp:
-                num = num[:-exp] + '.' + num[-exp:]
+            self._set_string(str(value).strip())
+
+    @classmethod
+    def from_decimal(cls, d):
+        number = cls.__new__(cls)
+        number.special = None
+        number._set_decimal(d)
+        return number
+
+    def _set_string(self, text):
+        m = _NUMBER_TEXT_RE.match(text)
+        if m and (m.group(2) or m.group(3)):
+            sign, integer, fraction, exponent = m.groups()
+            fraction = fraction or ''
+            try:
+                mantissa = int(integer + fraction)
+            except ValueError:
+                # Longer than int() accepts from a string; let Decimal do it.
+                pass
             else:
-                num = '0.' + '0' * (-exp - len(num)) + num
-        return num
-    
+                self.mantissa = -mantissa if sign == '-' else mantissa
+                self.exponent = int(exponent or 0) - len(fraction)
+                return
+        try:
+            d = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f"Invalid number '{text}'")
+        self._set_decimal(d)
+
+    def _set_decimal(self, d):
+        if d.is_nan():
+            raise ValueError("BigNumber cannot represent NaN")
+        if d.is_infinite():
+            self.mantissa = 0
+            self.exponent = 0
+            self.special = '-inf' if d < 0 else 'inf'
+            return
+        exponent = d.as_tuple().exponent
+        self.exponent = exponent
+        self.mantissa = int(d.scaleb(-exponent, context=_EXACT))
+
+    def to_decimal(self):
+        if self.special:
+            return Decimal(self.special)
+        return Decimal(self.mantissa).scaleb(self.exponent, context=_EXACT)
+
     def to_string(self):
         """Convert back to number string with decimal point"""
-        if 'inf' in self.chunks:
-            return 'inf'
-            
-        digits = ''.join(self.chunks)
-        if self.decimal_pos is None:
-            return digits
-            
-        if self.decimal_pos == len(digits):
-            return digits
-        elif self.decimal_pos > len(digits):
-            return digits + '0' * (self.decimal_pos - len(digits))
+        if self.special:
+            return self.special
+        try:
+            digits = str(abs(self.mantissa))
+        except ValueError:
+            # More digits than str(int) allows; Decimal has no such limit.
+            return format(self.to_decimal(), 'f')
+        exponent = self.exponent
+        if exponent >= 0:
+            text = digits + '0' * exponent if self.mantissa else '0'
+        elif len(digits) <= -exponent:
+            text = '0.' + '0' * (-exponent - len(digits)) + digits
         else:
-            return digits[:self.decimal_pos] + '.' + digits[self.decimal_pos:]
-    
+            text = digits[:exponent] + '.' + digits[exponent:]
+        return '-' + text if self.mantissa < 0 else text
+
+    def is_integer(self):
+        if self.special:
+            return False
+        return self.exponent >= 0 or self.mantissa % 10 ** -self.exponent == 0
+
     def __str__(self):
         return self.to_string()
 
-class ExpressionEvaluator:
+    def __repr__(self):
+        return f"BigNumber('{self.to_string()}')"
+
+    def __int__(self):
+        if self.special:
+            raise OverflowError("cannot convert infinity to integer")
+        if self.exponent >= 0:
+            return self.mantissa * 10 ** self.exponent
+        q = abs(self.mantissa) // 10 ** -self.exponent
+        return -q if self.mantissa < 0 else q
+
+    @staticmethod
+    def _coerce(other):
+        if isinstance(other, BigNumber):
+            return other
+        if isinstance(other, (int, Decimal)):
+            return BigNumber(other)
+        return None
+
+    @staticmethod
+    def _align(a, b):
+        exponent = min(a.exponent, b.exponent)
+        return (a.mantissa * 10 ** (a.exponent - exponent),
+                b.mantissa * 10 ** (b.exponent - exponent),
+                exponent)
+
+    def _via_decimal(self, other, op):
+        # Infinities follow Decimal's rules, which also reject inf - inf.
+        return BigNumber.from_decimal(op(self.to_decimal(), other.to_decimal()))
+
+    def __add__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        if self.special or other.special:
+            return self._via_decimal(other, lambda a, b: a + b)
+        a, b, exponent = self._align(self, other)
+        return BigNumber(mantissa=a + b, exponent=exponent)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        if self.special:
+            return BigNumber('-inf' if self.special == 'inf' else 'inf')
+        return BigNumber(mantissa=-self.mantissa, exponent=self.exponent)
+
+    def __abs__(self):
+        if self.special:
+            return BigNumber('inf')
+        return BigNumber(mantissa=abs(self.mantissa), exponent=self.exponent)
+
+    def __sub__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self + -other
+
+    def __rsub__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return other - self
+
+    def __mul__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        if self.special or other.special:
+            return self._via_decimal(other, lambda a, b: a * b)
+        return BigNumber(mantissa=self.mantissa * other.mantissa,
+                         exponent=self.exponent + other.exponent)
+
+    __rmul__ = __mul__
+
+    def __divmod__(self, other):
+        """Floor division and remainder, with the same signs as int divmod"""
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        if self.special or other.special:
+            raise ValueError("divmod is not defined for infinity")
+        a, b, exponent = self._align(self, other)
+        if b == 0:
+            raise ZeroDivisionError("Division by zero")
+        q, r = divmod(a, b)
+        return BigNumber(q), BigNumber(mantissa=r, exponent=exponent)
+
+    def __floordiv__(self, other):
+        result = self.__divmod__(other)
+        return result if result is NotImplemented else result[0]
+
+    def __mod__(self, other):
+        result = self.__divmod__(other)
+        return result if result is NotImplemented else result[1]
+
+    def __pow__(self, n):
+        if not isinstance(n, int) or n < 0:
+            return NotImplemented
+        if self.special:
+            return self._via_decimal(BigNumber(n), lambda a, b: a ** b)
+        return BigNumber(mantissa=self.mantissa ** n, exponent=self.exponent * n)
+
+    def _cmp(self, other):
+        if self.special or other.special:
+            a, b = self.to_decimal(), other.to_decimal()
+            return (a > b) - (a < b)
+        a, b, _ = self._align(self, other)
+        return (a > b) - (a < b)
+
+    def __eq__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self._cmp(other) == 0
+
+    def __lt__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self._cmp(other) < 0
+
+    def __le__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self._cmp(other) <= 0
+
+    def __gt__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self._cmp(other) > 0
+
+    def __ge__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self._cmp(other) >= 0
+
+    def __hash__(self):
+        return hash(self.to_decimal())
+
+
+_TOKEN_RE = re.compile(
+    r'(?P<number>[0-9.]+(?:[eE][+-]?[0-9]+)?)'
+    r'|(?P<name>[A-Za-z]+[0-9]*)'
+    r'|(?P<op>[-+*/^()])'
+)
+
+# Operator precedence; unary minus binds tighter than '^' so that it is
+# applied before any binary operator, like the old engine did.
+_BINARY_POWER = {'^': 4, '*': 3, '/': 3, '+': 2, '-': 2}
+_UNARY_POWER = 5
+
+
+class Token:
+    __slots__ = ('kind', 'text', 'pos')
+
+    def __init__(self, kind, text, pos):
+        self.kind = kind
+        self.text = text
+        self.pos = pos
+
+    def __repr__(self):
+        return f"Token({self.kind!r}, {self.text!r}, {self.pos})"
+
+
+class Node:
+    """Base class for AST nodes; `index` is the node's slot in the value table"""
+    __slots__ = ('index',)
+
+
+class NumberNode(Node):
+    __slots__ = ('text', 'value')
+
+    def __init__(self, text):
+        self.text = text
+        self.value = Decimal(text)
+
+
+class NameNode(Node):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class NegateNode(Node):
+    __slots__ = ('operand', 'pos')
+
+    def __init__(self, operand, pos):
+        self.operand = operand
+        self.pos = pos
+
+
+class BinaryNode(Node):
+    __slots__ = ('op', 'left', 'right', 'pos')
+
+    def __init__(self, op, left, right, pos):
+        self.op = op
+        self.left = left
+        self.right = right
+        self.pos = pos
+
+
+class GroupNode(Node):
+    __slots__ = ('inner', 'pos')
+
+    def __init__(self, inner, pos):
+        self.inner = inner
+        self.pos = pos
+
+
+class CallNode(Node):
+    __slots__ = ('name', 'inner', 'pos')
+
+    def __init__(self, name, inner, pos):
+        self.name = name
+        self.inner = inner
+        self.pos = pos
+
+
+def tokenize(expr, functions=()):
+    """Split a preprocessed expression into tokens in a single pass"""
+    tokens = []
+    pos = 0
+    n = len(expr)
+    while pos < n:
+        m = _TOKEN_RE.match(expr, pos)
+        if m is None:
+            raise ValueError(f"Invalid character '{expr[pos]}' in expression")
+        kind = m.lastgroup
+        text = m.group()
+        if kind == 'number':
+            if text.count('.') > 1 or text.strip('.') == '' or text[0] in 'eE':
+                raise ValueError(f"Invalid number '{text}'")
+        elif kind == 'name' and text not in functions:
+            # Only function names such as log10 may carry trailing digits;
+            # anything else is a name followed by an implicit multiplication.
+            text = text.rstrip('0123456789')
+        tokens.append(Token(kind, text, pos))
+        pos += len(text)
+    return tokens
+
+
+class Parser:
+    """Shunting-yard parser turning a token list into an AST.
+
+    The parser is iterative, so deeply nested input cannot hit Python's
+    recursion limit.
+    """
+
+    def __init__(self, tokens, functions):
+        self.tokens = tokens
+        self.functions = functions
+
+    def parse(self):
+        output = []
+        ops = []
+        expect_operand = True
+        tokens = self.tokens
+        i = 0
+        n = len(tokens)
+
+        while i < n:
+            tok = tokens[i]
+            i += 1
+            kind, text = tok.kind, tok.text
+
+            if kind == 'number' or kind == 'name' or text == '(':
+                if not expect_operand:
+                    if kind == 'number' and isinstance(output[-1], NumberNode):
+                        raise ValueError(f"Unexpected token '{text}'")
+                    # Implicit multiplication: 2(3), (1)(2), 2pi, pi(2), ...
+                    self._push_binary(output, ops, '*', tok.pos)
+                if kind == 'number':
+                    output.append(NumberNode(text))
+                    expect_operand = False
+                elif kind == 'name' and text in self.functions:
+                    if i >= n or tokens[i].text != '(':
+                        raise ValueError(f"Function {text} requires parentheses")
+                    ops.append(('call', text, tokens[i].pos))
+                    i += 1
+                    expect_operand = True
+                elif kind == 'name':
+                    output.append(NameNode(text))
+                    expect_operand = False
+                else:
+                    ops.append(('group', None, tok.pos))
+                    expect_operand = True
+            elif text == ')':
+                if expect_operand:
+                    raise ValueError("Mismatched parentheses")
+                while ops and ops[-1][0] not in ('group', 'call'):
+                    self._reduce(output, ops.pop())
+                if not ops:
+                    raise ValueError("Mismatched parentheses")
+                marker, name, pos = ops.pop()
+                inner = output.pop()
+                if marker == 'call':
+                    output.append(CallNode(name, inner, pos))
+                else:
+                    output.append(GroupNode(inner, pos))
+            elif expect_operand:
+                if text == '-':
+                    ops.append(('neg', None, tok.pos))
+                elif text != '+':
+                    raise ValueError(f"Unexpected token '{text}'")
+            else:
+                self._push_binary(output, ops, text, tok.pos)
+                expect_operand = True
+
+        if expect_operand:
+            raise ValueError("Unexpected end of expression")
+        while ops:
+            if ops[-1][0] in ('group', 'call'):
+                raise ValueError("Mismatched parentheses")
+            self._reduce(output, ops.pop())
+        return output[0]
+
+    def _push_binary(self, output, ops, op, pos):
+        power = _BINARY_POWER[op]
+        while ops:
+            top = ops[-1]
+            if top[0] == 'neg':
+                top_power = _UNARY_POWER
+            elif top[0] == 'binary':
+                top_power = _BINARY_POWER[top[1]]
+            else:
+                break
+            if top_power < power:
+                break
+            self._reduce(output, ops.pop())
+        ops.append(('binary', op, pos))
+
+    def _reduce(self, output, entry):
+        kind, op, pos = entry
+        if kind == 'neg':
+            output.append(NegateNode(output.pop(), pos))
+        else:
+            right = output.pop()
+            left = output.pop()
+            output.append(BinaryNode(op, left, right, pos))
+
+
+_OPEN = 0
+_CLOSE = 1
+_APPLY = 2
+
+
+class CompiledExpression:
+    """A parsed expression plus a flat evaluation schedule.
+
+    Parenthesised groups (and function arguments) are evaluated right to
+    left, innermost first, and inside each group operators run by
+    precedence then position. This keeps the step trace in the same order
+    the old string-rewriting engine produced it.
+    """
+
+    def __init__(self, source, root):
+        self.source = source
+        self.root = root
+        self.size = 0
+        self.nodes = []
+        self.program = []
+        if root is not None:
+            self._schedule()
+
+    def _schedule(self):
+        groups = []
+        region_ops = {None: []}
+        stack = [(self.root, None)]
+        while stack:
+            node, region = stack.pop()
+            node.index = self.size
+            self.size += 1
+            self.nodes.append(node)
+            if isinstance(node, (GroupNode, CallNode)):
+                groups.append(node)
+                region_ops[node] = []
+                stack.append((node.inner, node))
+            elif isinstance(node, NegateNode):
+                region_ops[region].append(node)
+                stack.append((node.operand, region))
+            elif isinstance(node, BinaryNode):
+                region_ops[region].append(node)
+                stack.append((node.right, region))
+                stack.append((node.left, region))
+
+        for group in sorted(groups, key=lambda g: g.pos, reverse=True):
+            self.program.append((_OPEN, group))
+            self.program.extend(self._ordered(region_ops[group]))
+            self.program.append((_CLOSE, group))
+        self.program.extend(self._ordered(region_ops[None]))
+
+    @staticmethod
+    def _ordered(ops):
+        def key(node):
+            if isinstance(node, NegateNode):
+                return (0, -node.pos)
+            return (5 - _BINARY_POWER[node.op], node.pos)
+        return [(_APPLY, node) for node in sorted(ops, key=key)]
+
+    def estimate_cost(self, precision):
+        """Rough cost of one evaluation at `precision` digits, before running it.
+
+        Additions cost about one unit per digit, multiplications and
+        divisions a few, and logarithms, exponentials, trigonometric
+        functions and non-integer powers grow with the square of the
+        precision.
+        """
+        p = precision
+        cost = 0
+        for code, node in self.program:
+            if code == _OPEN:
+                continue
+            if code == _CLOSE:
+                if isinstance(node, CallNode):
+                    if node.name in ('log', 'log10', 'exp', 'sin', 'cos', 'tan'):
+                        cost += p * p
+                    elif node.name == 'sqrt':
+                        cost += 10 * p
+                    else:
+                        cost += p
+            elif isinstance(node, NegateNode) or node.op in '+-':
+                cost += p
+            elif node.op == '*':
+                cost += 2 * p
+            elif node.op == '/':
+                cost += 4 * p
+            elif isinstance(node.right, NumberNode) and node.right.value == node.right.value.to_integral_value():
+                cost += 2 * p * max(1, int(abs(node.right.value)).bit_length())
+            else:
+                cost += 2 * p * p
+        return cost
+
+
+def _decimal_to_string(d):
+    """Convert Decimal to string without scientific notation"""
+    if d.is_infinite():
+        return 'inf'
+    if d.is_nan():
+        return 'NaN'
+    return format(d, 'f')
+
+
+# Step trace event codes
+_EV_START = 0
+_EV_OPEN = 1
+_EV_INNER = 2
+_EV_CALL = 3
+_EV_RESULT = 4
+_EV_AFTER = 5
+_EV_NEGATE = 6
+_EV_BINARY = 7
+
+
+class StepTrace:
+    """Step-by-step record of one evaluation, rendered on demand.
+
+    Evaluation only records an (event code, node index) pair per step in a
+    preallocated buffer, plus the step at which each node got its value.
+    The familiar "Evaluating: ..." strings are built when a step is read,
+    so an "After parentheses" line costs nothing unless someone looks at
+    it. Iterate, index or slice the trace, or use page() to render a
+    window of it. With `max_steps`, only the first steps are kept;
+    `total` still counts them all and `truncated` says whether any were
+    dropped. A pickled trace is sent as its rendered list of steps; the
+    parsed expression is nested deeply enough for long inputs that
+    pickling it would overflow the recursion limit.
+    """
+
+    def __init__(self, compiled, values, names, max_steps=None):
+        capacity = 1 + 3 * len(compiled.program) if compiled.root is not None else 0
+        if max_steps is not None:
+            capacity = min(capacity, max(max_steps, 0))
+        self.compiled = compiled
+        self.values = values
+        self.names = names
+        self.capacity = capacity
+        self.total = 0
+        self.codes = array('b', bytes(capacity))
+        self.refs = array('l', bytes(capacity * array('l').itemsize))
+        self.assigned_at = array('l', [-1]) * compiled.size
+
+    def record(self, code, index=0):
+        n = self.total
+        if n < self.capacity:
+            self.codes[n] = code
+            self.refs[n] = index
+        self.total = n + 1
+
+    def assign(self, index):
+        self.assigned_at[index] = self.total
+
+    @property
+    def truncated(self):
+        return self.total > self.capacity
+
+    def page(self, start=0, count=None):
+        """Render `count` steps starting at `start`"""
+        stop = len(self) if count is None else min(len(self), start + count)
+        return [self._render_step(i) for i in range(start, stop)]
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._render_step(i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._render_step(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("step index out of range")
+        return self._render_step(i)
+
+    def __eq__(self, other):
+        if isinstance(other, (StepTrace, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def __repr__(self):
+        return f"StepTrace({len(self)} steps{', truncated' if self.truncated else ''})"
+
+    def _render_step(self, i):
+        code = self.codes[i]
+        if code == _EV_START:
+            return f"Evaluating: {self._render(self.compiled.root, i)}"
+        if code == _EV_AFTER:
+            return f"After parentheses: {self._render(self.compiled.root, i)}"
+        node = self.compiled.nodes[self.refs[i]]
+        if code == _EV_OPEN:
+            return f"Evaluating parentheses: {self._render(node.inner, i)}"
+        if code == _EV_INNER:
+            return f"Evaluating: {self._render(node.inner, i)}"
+        if code == _EV_CALL:
+            return f"Evaluating: {node.name}({self._value(node.inner)})"
+        if code == _EV_RESULT:
+            return f"Result: {self._value(node)}"
+        if code == _EV_NEGATE:
+            return f"Evaluating: -{self._value(node.operand)}"
+        return f"Evaluating: {self._value(node.left)} {node.op} {self._value(node.right)}"
+
+    def _value(self, node):
+        value = self.values[node.index]
+        if value is None:
+            value = node.value if isinstance(node, NumberNode) else self.names[node.name]
+        return _decimal_to_string(value)
+
+    def _render(self, node, step):
+        """Render the expression as it stood when step `step` was taken"""
+        values = self.values
+        assigned_at = self.assigned_at
+        parts = []
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            when = assigned_at[item.index]
+            if 0 <= when <= step:
+                parts.append(_decimal_to_string(values[item.index]))
+            elif isinstance(item, NumberNode):
+                parts.append(item.text)
+            elif isinstance(item, NameNode):
+                parts.append(_decimal_to_string(self.names[item.name]))
+            elif isinstance(item, NegateNode):
+                stack.extend((item.operand, '-'))
+            elif isinstance(item, BinaryNode):
+                stack.extend((item.right, item.op, item.left))
+            elif isinstance(item, GroupNode):
+                stack.extend((')', item.inner, '('))
+            else:
+                stack.extend((')', item.inner, item.name + '('))
+        return ''.join(parts)
+
+
+class ExpressionCache:
+    """Thread-safe LRU cache of CompiledExpression objects.
+
+    Keys are the normalised expression text produced by
+    ExpressionEvaluator._preprocess. Compiled expressions only hold the
+    parsed structure and resolve variables when they are evaluated, so
+    entries stay valid when set_variable changes a value. A maxsize of 0
+    disables caching.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return compiled
+
+    def put(self, key, compiled):
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        """Change the capacity, evicting least recently used entries if needed"""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def _evict(self):
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by every evaluator unless one is given its own cache.
+expression_cache = ExpressionCache()
+
+
+# Transcendental functions at the precision of the current Decimal context.
+# pi and e are computed once per precision, and ln, exp, sqrt and sin/cos
+# results are memoized by argument and precision. The memoized helpers run
+# in a context of their own, so they report whether the result was rounded
+# and the caller raises Inexact itself; adaptive precision relies on it.
+_GUARD_DIGITS = 10
+_MEMO_SIZE = 1024
+# sin/cos reduce their argument exactly, which needs a digit of working
+# precision per digit of its integer part; larger arguments are refused.
+_MAX_TRIG_MAGNITUDE = 10000
+
+
+def _context(prec):
+    return decimal.Context(prec=prec, Emax=_EMAX, Emin=_EMIN)
+
+
+def _chudnovsky_pi(prec):
+    """pi to `prec` digits from the Chudnovsky series, summed by binary
+    splitting in integer arithmetic; each term adds about 14 digits"""
+    c3_over_24 = 640320 ** 3 // 24
+
+    def split(a, b):
+        if b - a == 1:
+            if a == 0:
+                p = q = 1
+            else:
+                p = (6 * a - 5) * (2 * a - 1) * (6 * a - 1)
+                q = a * a * a * c3_over_24
+            t = p * (13591409 + 545140134 * a)
+            return p, q, -t if a & 1 else t
+        m = (a + b) // 2
+        p1, q1, t1 = split(a, m)
+        p2, q2, t2 = split(m, b)
+        return p1 * p2, q1 * q2, q2 * t1 + p1 * t2
+
+    _, q, t = split(0, prec // 14 + 2)
+    ctx = _context(prec + _GUARD_DIGITS)
+    pi = ctx.divide(ctx.multiply(ctx.sqrt(Decimal(10005)), Decimal(426880 * q)), Decimal(t))
+    return _context(prec).plus(pi)
+
+
+@functools.lru_cache(maxsize=32)
+def _pi(prec):
+    return _chudnovsky_pi(prec)
+
+
+@functools.lru_cache(maxsize=32)
+def _e(prec):
+    return _context(prec).exp(Decimal(1))
+
+
+def _sin_cos(x, prec):
+    """(sin x, cos x) to `prec` digits.
+
+    x is reduced by multiples of pi/2 to |r| <= pi/4, with pi carried to
+    enough digits that the reduction is exact; if r comes out much smaller
+    than x (x close to a multiple of pi/2) it is recomputed with the lost
+    digits added. r is then halved k times, sin and cos are summed as
+    Taylor series and doubled back with sin 2a = 2 sin a cos a and
+    cos 2a = 1 - 2 sin^2 a.
+    """
+    if not x:
+        return Decimal(0), Decimal(1)
+    if x.adjusted() > _MAX_TRIG_MAGNITUDE:
+        raise ValueError("Argument too large for trigonometric function")
+
+    k = int(prec ** 0.5 / 2)
+    base = prec + _GUARD_DIGITS + k + max(0, x.adjusted())
+    wp = base
+    while True:
+        with decimal.localcontext(_context(wp)):
+            half_pi = _pi(wp) / 2
+            n = (x / half_pi).to_integral_value()
+            r = x - n * half_pi
+        needed = base + (-r.adjusted() if r else wp)
+        if wp >= needed:
+            break
+        wp = needed
+
+    with decimal.localcontext(_context(wp)):
+        y = r / 2 ** k
+        y2 = y * y
+        sin = term = y
+        i = 1
+        while term:
+            term = -term * y2 / ((i + 1) * (i + 2))
+            i += 2
+            if abs(term) < sin.copy_abs().scaleb(-wp):
+                break
+            sin += term
+        cos = term = Decimal(1)
+        i = 0
+        while term:
+            term = -term * y2 / ((i + 1) * (i + 2))
+            i += 2
+            if abs(term).adjusted() < -wp:
+                break
+            cos += term
+        for _ in range(k):
+            sin, cos = 2 * sin * cos, 1 - 2 * sin * sin
+
+    quadrant = int(n) % 4
+    if quadrant == 1:
+        sin, cos = cos, sin.copy_negate()
+    elif quadrant == 2:
+        sin, cos = sin.copy_negate(), cos.copy_negate()
+    elif quadrant == 3:
+        sin, cos = cos.copy_negate(), sin
+    ctx = _context(prec)
+    return ctx.plus(sin), ctx.plus(cos)
+
+
+@functools.lru_cache(maxsize=_MEMO_SIZE)
+def _memo_unary(name, text, prec):
+    """Memoized (result, inexact) of one function at one precision"""
+    x = Decimal(text)
+    if name == 'sin_cos':
+        return _sin_cos(x, prec), bool(x)
+    ctx = _context(prec)
+    result = getattr(ctx, name)(x)
+    return result, bool(ctx.flags[decimal.Inexact])
+
+
+def _unary(name, x):
+    """Apply a memoized function at the current context's precision"""
+    ctx = decimal.getcontext()
+    result, inexact = _memo_unary(name, str(x), ctx.prec)
+    if inexact:
+        ctx.flags[decimal.Inexact] = True
+        ctx.flags[decimal.Rounded] = True
+    return result
+
+
+class _Constants(MutableMapping):
+    """Named constants; pi and e take the precision of the current context.
+
+    Computed constants are inexact, so the evaluator raises Inexact when
+    it looks one up. Constants set by assignment are plain values.
+    """
+
     def __init__(self):
+        self._values = {'pi': _pi, 'e': _e}
+
+    def is_computed(self, name):
+        return callable(self._values.get(name))
+
+    def __getitem__(self, name):
+        value = self._values[name]
+        return value(decimal.getcontext().prec) if callable(value) else value
+
+    def __setitem__(self, name, value):
+        self._values[name] = value
+
+    def __delitem__(self, name):
+        del self._values[name]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class ExpressionEvaluator:
+    """Evaluate arithmetic expressions at arbitrary Decimal precision.
+
+    An evaluator can be shared between threads: evaluate() and
+    evaluate_many() keep their working values and step trace local to the
+    call and run in their own Decimal context. set_variable() swaps in a
+    new variables mapping rather than mutating the one a running
+    evaluation is reading, so each evaluation sees a consistent snapshot.
+    """
+
+    def __init__(self, cache=None, precision=DEFAULT_PRECISION, adaptive=False, exact_integers=False):
         self.operators = {
             '^': (4, lambda a, b: self._power(a, b)),
             '/': (3, lambda a, b: self._divide(a, b)),
@@ -101,9 +981,9 @@ class ExpressionEvaluator:
         
         
         self.functions = {
-            'sin': lambda x: self._trig(math.sin, x),
-            'cos': lambda x: self._trig(math.cos, x),
-            'tan': lambda x: self._trig(math.tan, x),
+            'sin': lambda x: self._trig('sin', x),
+            'cos': lambda x: self._trig('cos', x),
+            'tan': lambda x: self._trig('tan', x),
             'sqrt': lambda x: self._sqrt(x),
             'log': lambda x: self._log(x),
             'log10': lambda x: self._log10(x),
@@ -115,595 +995,716 @@ class ExpressionEvaluator:
         }
         
         
-        self.constants = {
-            'pi': str(Decimal(str(math.pi))),
-            'e': str(Decimal(str(math.e))),
-        }
+        self.constants = _Constants()
         
         
         self.variables = {}
         
         
-        self.steps = []
+        self.cache = expression_cache if cache is None else cache
+        
+        
+        self.precision = precision
+        self.adaptive = adaptive
+        
+        # Integer +, -, * and ^ go through BigNumber and are never rounded
+        self.exact_integers = exact_integers
+        
+        
+        self._variables_lock = threading.Lock()
     
     def set_variable(self, name, value):
         """Set a variable value"""
         try:
             
-            Decimal(value)
-            self.variables[name] = value
+            value_dec = Decimal(value)
+            with self._variables_lock:
+                variables = dict(self.variables)
+                variables[name] = value_dec
+                self.variables = variables
             return f"Variable '{name}' set to {value}"
         except (InvalidOperation, ValueError):
             return f"Error: Invalid value for variable '{name}'"
     
     def get_variable(self, name):
         """Get a variable value"""
-        return self.variables.get(name, None)
+        value = self.variables.get(name, None)
+        if value is None:
+            return None
+        return self._decimal_to_string(value)
     
-    def evaluate(self, expression, show_steps=False):
-        """Main evaluation method with comprehensive error handling"""
-        global sbse
-        
+    def evaluate(self, expression, show_steps=False, precision=None, adaptive=None, max_steps=None):
+        """Main evaluation method with comprehensive error handling.
+
+        `precision` is the number of significant digits to compute with and
+        `adaptive` starts at a low working precision and only raises it when
+        a result is inexact; both default to the evaluator's settings.
+        With show_steps the result dict carries a StepTrace, keeping at most
+        `max_steps` steps when given.
+        """
         try:
             
-            self.steps = []
+            compiled = self._compile(expression)
+            variables = self.variables
+            traces = []
             
             
-            self._validate_expression(expression)
+            def run():
+                trace = None
+                if show_steps:
+                    values = [None] * compiled.size
+                    # Only the constants the expression uses are resolved;
+                    # pi and e cost a computation at each new precision.
+                    names = dict(variables)
+                    for node in compiled.nodes:
+                        if isinstance(node, NameNode) and node.name in self.constants:
+                            names[node.name] = self.constants[node.name]
+                    trace = StepTrace(compiled, values, names, max_steps)
+                    traces[:] = [trace]
+                return self._run(compiled, variables, trace)
             
+            result = self._with_precision(run, precision, adaptive)
             
-            expr = self._preprocess(expression)
             
-            
-            if expr.count('(') != expr.count(')'):
-                raise ValueError("Mismatched parentheses")
-            
-            
-            result = self._evaluate_expression(expr, show_steps)
-            
-            
-            if result == 'inf':
-                result_str = 'inf'
-            else:
-                result_str = str(BigNumber(result))
-            
-            
-            sbse = self.steps.copy()
+            result_str = self._format_result(result)
             
             
             if show_steps:
-                return {"result": result_str, "steps": self.steps}
+                return {"result": result_str, "steps": traces[0]}
             return result_str
             
-        except ZeroDivisionError:
-            error_msg = "Error: Division by zero"
-            sbse = []
-            return error_msg
-        except ValueError as ve:
-            error_msg = f"Error: {str(ve)}"
-            sbse = []
-            return error_msg
-        except (InvalidOperation, OverflowError):
-            error_msg = "Error: Number too large or invalid operation"
-            sbse = []
-            return error_msg
         except Exception as e:
-            error_msg = f"Error: {str(e)}"
-            sbse = []
-            return error_msg
+            return self._error_message(e)
     
-    def _validate_expression(self, expr):
-        """Validate expression for invalid characters"""
-        
-        valid_chars = set("0123456789.+-*/^()eE×· ")
-        expr_no_spaces = expr.replace(' ', '')
+    def evaluate_many(self, expression, bindings, exact=True, precision=None, adaptive=None):
+        """Evaluate one expression over columns of variable values.
+
+        `bindings` maps variable names to equal-length sequences; names not
+        in it fall back to constants and set_variable values. Constants
+        such as pi and e cannot be bound. The expression
+        is parsed once and every operation runs over a whole column.
+
+        With exact=True (the default) values are Decimals and a list of
+        result strings is returned, formatted like evaluate(); a row that
+        fails gets its own "Error: ..." string. With exact=False the columns
+        are NumPy float64 arrays and an array is returned, with nan/inf
+        where a row has no finite result.
+
+        Problems with the expression or the bindings themselves, such as a
+        value that is not a number, raise ValueError.
+        """
+        for name in bindings:
+            if name in self.constants:
+                raise ValueError(f"Cannot bind constant '{name}'")
+        lengths = {len(column) for column in bindings.values()}
+        if len(lengths) > 1:
+            raise ValueError("All binding columns must have the same length")
+        n = lengths.pop() if lengths else 1
         
-        for char in expr_no_spaces:
-            if char not in valid_chars and not char.isalpha():
-                raise ValueError(f"Invalid character '{char}' in expression")
+        compiled = self._compile(expression)
+        variables = self.variables
+        if exact:
+            return self._with_precision(
+                lambda: self._run_exact_columns(compiled, bindings, n, variables), precision, adaptive)
+        return self._run_float_columns(compiled, bindings, n, variables)
     
-    def _preprocess(self, expr):
-        """Handle implicit multiplication, scientific notation, functions, and variables"""
-        
-        expr = expr.replace(' ', '')
-        
-        
-        expr = expr.replace('×', '*')
-        expr = expr.replace('·', '*')
-        
-        
-        expr = self._process_signs_and_multiplication(expr)
+    def _with_precision(self, func, precision=None, adaptive=None):
+        """Call func inside a local Decimal context of the requested precision.
+
+        In adaptive mode func is first run at a small working precision and
+        re-run with four times the digits (capped at `precision`) whenever
+        the previous attempt rounded anything, so exact results never pay
+        for digits they do not need and inexact ones end at full precision.
+        """
+        if precision is None:
+            precision = self.precision
+        if adaptive is None:
+            adaptive = self.adaptive
+        if not isinstance(precision, int) or precision < 1:
+            raise ValueError("Precision must be a positive integer")
         
+        working = min(_ADAPTIVE_START, precision) if adaptive else precision
+        while True:
+            final = working >= precision
+            ctx = decimal.Context(prec=working, Emax=_EMAX, Emin=_EMIN)
+            with decimal.localcontext(ctx) as local:
+                try:
+                    result = func()
+                except Exception:
+                    if final or not local.flags[decimal.Inexact]:
+                        raise
+                else:
+                    if final or not local.flags[decimal.Inexact]:
+                        return result
+            working = min(working * 4, precision)
+    
+    def estimate_cost(self, expression, precision=None):
+        """Estimated cost of evaluating an expression; 0 if it does not compile"""
+        try:
+            compiled = self._compile(expression)
+        except Exception:
+            return 0
+        return compiled.estimate_cost(self.precision if precision is None else precision)
+    
+    def _format_result(self, result):
+        """Convert a final Decimal result to its output string"""
+        if result is None:
+            return '0'
+        if result.is_infinite():
+            return 'inf'
+        return self._decimal_to_string(result)
+    
+    def _error_message(self, error):
+        """Map an evaluation exception to the user-facing error string"""
+        if isinstance(error, ZeroDivisionError):
+            return "Error: Division by zero"
+        if isinstance(error, (InvalidOperation, OverflowError)):
+            return "Error: Number too large or invalid operation"
+        return f"Error: {str(error)}"
+    
+    def _run_exact_columns(self, compiled, bindings, n, variables):
+        """Column-wise Decimal evaluation backing evaluate_many(exact=True)"""
+        if compiled.root is None:
+            return ['0'] * n
         
-        expr = self._process_constants(expr)
+        errors = [None] * n
+        values = [None] * compiled.size
         
-        expr = self._process_variables(expr)
+        def leaf(node):
+            if isinstance(node, NumberNode):
+                return [node.value] * n
+            if node.name in bindings:
+                try:
+                    return [v if isinstance(v, Decimal) else Decimal(str(v)) for v in bindings[node.name]]
+                except decimal.InvalidOperation:
+                    raise ValueError(f"Invalid value for variable '{node.name}'")
+            return [self._lookup(node.name, variables)] * n
         
-        expr = self._process_functions(expr)
+        def column(node):
+            value = values[node.index]
+            return leaf(node) if value is None else value
         
+        def apply(func, *columns):
+            out = [None] * n
+            for row, args in enumerate(zip(*columns)):
+                if errors[row] is None:
+                    try:
+                        out[row] = func(*args)
+                    except Exception as e:
+                        errors[row] = e
+            return out
         
-        expr = re.sub(r'(\d+\.?\d*[eE][+-]?\d+)(\()', r'\1*\2', expr)
-        expr = re.sub(r'(\d+\.?\d*[eE][+-]?\d+)([a-zA-Z])', r'\1*\2', expr)
+        for code, node in compiled.program:
+            if code == _OPEN:
+                continue
+            if code == _CLOSE:
+                result = column(node.inner)
+                if isinstance(node, CallNode):
+                    func = self.functions[node.name]
+                    name = node.name
+                    
+                    def call(x, func=func, name=name):
+                        try:
+                            return func(x)
+                        except Exception as e:
+                            raise ValueError(f"Error in function {name}: {str(e)}")
+                    result = apply(call, result)
+            elif isinstance(node, NegateNode):
+                result = apply(self._apply_unary_minus, column(node.operand))
+            else:
+                result = apply(self.operators[node.op][1], column(node.left), column(node.right))
+            values[node.index] = result
         
-        return expr
+        results = column(compiled.root)
+        return [
+            self._error_message(errors[row]) if errors[row] is not None else self._format_result(results[row])
+            for row in range(n)
+        ]
     
-    def _process_signs_and_multiplication(self, expr):
-        """Process unary signs and implicit multiplication according to basic math rules"""
-        
-        
-        expr = re.sub(r'(\d)(\()', r'\1*\2', expr)    
-        expr = re.sub(r'(\))(\d)', r'\1*\2', expr)    
-        expr = re.sub(r'(\))([a-zA-Z])', r'\1*\2', expr)  
-        expr = re.sub(r'([a-zA-Z])(\()', r'\1*\2', expr)  
-        expr = re.sub(r'([a-zA-Z])(\d)', r'\1*\2', expr)  
-        expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', expr)  
-        expr = re.sub(r'(\))(\()', r'\1*\2', expr)    
+    def _run_float_columns(self, compiled, bindings, n, variables):
+        """Column-wise NumPy float64 evaluation backing evaluate_many(exact=False)"""
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("evaluate_many(exact=False) requires numpy")
         
+        if compiled.root is None:
+            return np.zeros(n)
         
+        functions = {
+            'sin': np.sin,
+            'cos': np.cos,
+            'tan': np.tan,
+            'sqrt': np.sqrt,
+            'log': np.log,
+            'log10': np.log10,
+            'exp': np.exp,
+            'abs': np.abs,
+            'floor': np.floor,
+            'ceil': np.ceil,
+            'round': lambda x: np.copysign(np.floor(np.abs(x) + 0.5), x),
+        }
+        operators = {
+            '^': np.power,
+            '/': np.true_divide,
+            '*': np.multiply,
+            '+': np.add,
+            '-': np.subtract,
+        }
+        values = [None] * compiled.size
         
-        tokens = []
-        i = 0
-        n = len(expr)
+        def column(node):
+            value = values[node.index]
+            if value is not None:
+                return value
+            if isinstance(node, NumberNode):
+                return np.full(n, float(node.value))
+            if node.name in bindings:
+                try:
+                    return np.asarray(bindings[node.name], dtype=np.float64)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Invalid value for variable '{node.name}'")
+            return np.full(n, float(self._lookup(node.name, variables)))
         
-        while i < n:
-            if expr[i] in '+-':
-                
-                is_unary = False
-                
-                
-                if i == 0:
-                    is_unary = True
-                
-                elif i > 0 and expr[i-1] == '(':
-                    is_unary = True
-                
-                elif i > 0 and expr[i-1] in '+-*/^':
-                    is_unary = True
-                
-                if is_unary:
-                    if expr[i] == '-':
-                        tokens.append('u-')  
-                    
-                    i += 1
+        with np.errstate(all='ignore'):
+            for code, node in compiled.program:
+                if code == _OPEN:
+                    continue
+                if code == _CLOSE:
+                    result = column(node.inner)
+                    if isinstance(node, CallNode):
+                        result = functions[node.name](result)
+                elif isinstance(node, NegateNode):
+                    result = np.negative(column(node.operand))
                 else:
-                    tokens.append(expr[i])
-                    i += 1
-            else:
-                tokens.append(expr[i])
-                i += 1
-        
-        
-        expr = ''.join(tokens)
-        
-        return expr
+                    result = operators[node.op](column(node.left), column(node.right))
+                values[node.index] = result
+            
+            return column(compiled.root)
     
-    def _process_functions(self, expr):
-        """Process mathematical functions with proper handling of nested parentheses"""
+    def _validate_expression(self, expr):
+        """Validate expression for invalid characters"""
         
-        i = 0
-        while i < len(expr):
-            
-            matched = False
-            for func_name in self.functions:
-                if expr.startswith(func_name, i) and i+len(func_name) < len(expr) and expr[i+len(func_name)] == '(':
-                    
-                    
-                    start = i + len(func_name) + 1  
-                    count = 1
-                    j = start
-                    while j < len(expr) and count > 0:
-                        if expr[j] == '(':
-                            count += 1
-                        elif expr[j] == ')':
-                            count -= 1
-                        j += 1
-                    if count == 0:
-                        
-                        arg = expr[start:j-1]
-                        try:
-                            
-                            arg_value = self._evaluate_expression(arg)
-                            
-                            result = self.functions[func_name](arg_value)
-                            
-                            expr = expr[:i] + result + expr[j:]
-                            
-                            matched = True
-                            break
-                        except Exception as e:
-                            raise ValueError(f"Error in function {func_name}: {str(e)}")
-                    else:
-                        
-                        raise ValueError(f"Mismatched parentheses in function {func_name}")
-            if not matched:
-                i += 1
-        return expr
-    
-    def _process_variables(self, expr):
-        """Replace variables with their values"""
-        for var_name, var_value in self.variables.items():
-            
-            pattern = rf'\b{var_name}\b'
-            expr = re.sub(pattern, var_value, expr)
-        return expr
+        valid_chars = set("0123456789.+-*/^()eE×· ")
+        expr_no_spaces = expr.replace(' ', '')
+        
+        for char in expr_no_spaces:
+            if char not in valid_chars and not char.isalpha():
+                raise ValueError(f"Invalid character '{char}' in expression")
     
-    def _process_constants(self, expr):
-        """Replace constants with their values"""
-        for const_name, const_value in self.constants.items():
-            
-            pattern = rf'\b{const_name}\b'
-            expr = re.sub(pattern, const_value, expr)
-        return expr
+    def _preprocess(self, expr):
+        """Strip spaces and normalise the alternative multiplication signs"""
+        return expr.replace(' ', '').replace('×', '*').replace('·', '*')
     
-    def _evaluate_expression(self, expr, show_steps=False):
-        """Evaluate expression following BODMAS rules"""
-        if show_steps:
-            self.steps.append(f"Evaluating: {expr}")
-        
+    def _compile(self, expression):
+        """Return the CompiledExpression for an expression, parsing it only on a cache miss"""
+        expr = self._preprocess(expression)
         
-        while 'u-' in expr:
-            expr = self._evaluate_unary_minus(expr, show_steps)
+        compiled = self.cache.get(expr)
+        if compiled is not None:
+            return compiled
         
+        self._validate_expression(expr)
         
-        while '(' in expr:
-            expr = self._evaluate_parentheses(expr, show_steps)
+        if expr.count('(') != expr.count(')'):
+            raise ValueError("Mismatched parentheses")
         
+        tokens = tokenize(expr, self.functions)
+        root = Parser(tokens, self.functions).parse() if tokens else None
+        compiled = CompiledExpression(expr, root)
+        self.cache.put(expr, compiled)
+        return compiled
+    
+    def _run(self, compiled, variables, trace=None):
+        """Evaluate a compiled expression in a single pass over its schedule.
+
+        Steps are recorded into `trace` when one is given; it then also
+        owns the value table so it can render steps later.
+        """
+        if compiled.root is None:
+            return None
         
-        for op in sorted(self.operators.keys(), key=lambda x: self.operators[x][0], reverse=True):
-            expr = self._evaluate_operator(expr, op, show_steps)
+        if trace is not None:
+            values = trace.values
+            record = trace.record
+            assign = trace.assign
+            record(_EV_START)
+        else:
+            values = [None] * compiled.size
+        show_steps = trace is not None
         
-        return expr
-    
-    def _evaluate_unary_minus(self, expr, show_steps=False):
-        """Evaluate unary minus operations"""
-        i = 0
-        while i < len(expr):
-            if expr.startswith('u-', i):
-                
-                j = i + 2  
-                
-                if j >= len(expr):
-                    raise ValueError("Incomplete unary minus operation")
-                
-                if expr[j] == '(':
-                    
-                    count = 1
-                    k = j + 1
-                    while k < len(expr) and count > 0:
-                        if expr[k] == '(':
-                            count += 1
-                        elif expr[k] == ')':
-                            count -= 1
-                        k += 1
-                    
-                    if count != 0:
-                        raise ValueError("Mismatched parentheses")
-                    
-                    operand = expr[j:k]
-                    
-                    
-                    operand_value = self._evaluate_expression(operand)
-                    
-                    
+        for code, node in compiled.program:
+            if code == _OPEN:
+                if show_steps:
+                    record(_EV_OPEN, node.index)
+                    record(_EV_INNER, node.index)
+            elif code == _CLOSE:
+                result = self._value(node.inner, values, variables)
+                if isinstance(node, CallNode):
                     if show_steps:
-                        self.steps.append(f"Evaluating: -({operand}) = -({operand_value})")
-                    result = self._apply_unary_minus(operand_value)
+                        record(_EV_CALL, node.index)
+                    try:
+                        result = self.functions[node.name](result)
+                    except Exception as e:
+                        raise ValueError(f"Error in function {node.name}: {str(e)}")
+                    values[node.index] = result
                     if show_steps:
-                        self.steps.append(f"Result: {result}")
-                    
-                    
-                    expr = expr[:i] + result + expr[k:]
-                    
+                        assign(node.index)
+                        record(_EV_RESULT, node.index)
                 else:
-                    
-                    k = j
-                    while k < len(expr) and expr[k] not in '+-*/^()':
-                        k += 1
-                    
-                    operand = expr[j:k]
-                    
-                    
-                    if show_steps:
-                        self.steps.append(f"Evaluating: -{operand}")
-                    result = self._apply_unary_minus(operand)
+                    values[node.index] = result
                     if show_steps:
-                        self.steps.append(f"Result: {result}")
-                    
-                    
-                    expr = expr[:i] + result + expr[k:]
-                    
+                        assign(node.index)
+                if show_steps:
+                    record(_EV_AFTER)
+            elif isinstance(node, NegateNode):
+                operand = self._value(node.operand, values, variables)
+                if show_steps:
+                    record(_EV_NEGATE, node.index)
+                values[node.index] = self._apply_unary_minus(operand)
+                if show_steps:
+                    assign(node.index)
+                    record(_EV_RESULT, node.index)
             else:
-                i += 1
+                left = self._value(node.left, values, variables)
+                right = self._value(node.right, values, variables)
+                if show_steps:
+                    record(_EV_BINARY, node.index)
+                values[node.index] = self.operators[node.op][1](left, right)
+                if show_steps:
+                    assign(node.index)
+                    record(_EV_RESULT, node.index)
         
-        return expr
+        return self._value(compiled.root, values, variables)
     
-    def _evaluate_parentheses(self, expr, show_steps=False):
-        """Evaluate innermost parentheses"""
-        start = expr.rfind('(')
-        end = expr.find(')', start)
-        if start == -1 or end == -1:
-            return expr
-            
-        inner_expr = expr[start+1:end]
-        if show_steps:
-            self.steps.append(f"Evaluating parentheses: {inner_expr}")
-        result = self._evaluate_expression(inner_expr, show_steps)
-        new_expr = expr[:start] + result + expr[end+1:]
-        if show_steps:
-            self.steps.append(f"After parentheses: {new_expr}")
-        return new_expr
+    def _value(self, node, values, variables):
+        """Current value of a node: computed result, literal, or name lookup"""
+        value = values[node.index]
+        if value is not None:
+            return value
+        if isinstance(node, NumberNode):
+            return node.value
+        if isinstance(node, NameNode):
+            return self._lookup(node.name, variables)
+        raise ValueError("Incomplete expression")
     
-    def _evaluate_operator(self, expr, op, show_steps=False):
-        """Evaluate all instances of an operator in expression"""
-        precedence, func = self.operators[op]
-        
-        
-        pattern = r'([+\-*/^])'
-        tokens = re.split(pattern, expr)
-        
-        i = 0
-        while i < len(tokens):
-            if tokens[i] == op:
-                
-                left = tokens[i-1]
-                right = tokens[i+1]
-                
-                
-                try:
-                    if show_steps:
-                        self.steps.append(f"Evaluating: {left} {op} {right}")
-                    result = func(left, right)
-                    if show_steps:
-                        self.steps.append(f"Result: {result}")
-                    tokens[i-1:i+2] = [result]
-                    i -= 1
-                except (InvalidOperation, ValueError, ZeroDivisionError, OverflowError) as e:
-                    raise e
-            i += 1
-        
-        return ''.join(tokens)
+    def _lookup(self, name, variables):
+        """Resolve a constant or variable name to its value"""
+        if name in self.constants:
+            if self.constants.is_computed(name):
+                decimal.getcontext().flags[decimal.Inexact] = True
+            return self.constants[name]
+        if name in variables:
+            return variables[name]
+        raise ValueError(f"Unknown variable '{name}'")
     
     def _apply_unary_minus(self, value):
         """Apply unary minus to a value"""
-        try:
-            
-            if value in self.variables:
-                value = self.variables[value]
-            
-            
-            d = Decimal(value)
-            result = -d
-            
-            
-            return self._decimal_to_string(result)
-        except (InvalidOperation, ValueError, OverflowError) as e:
-            raise e
+        if self.exact_integers:
+            return value.copy_negate()
+        return -value
     
     def _decimal_to_string(self, d):
         """Convert Decimal to string without scientific notation"""
-        if d.is_infinite():
-            return 'inf'
-        if d.is_nan():
-            return 'NaN'
-        
-        sign, digits, exponent = d.as_tuple()
-        
-        digits_str = ''.join(str(digit) for digit in digits)
-        
-        if exponent >= 0:
-            result = digits_str + '0' * exponent
-        else:
-            exp = -exponent
-            if len(digits_str) <= exp:
-                result = '0.' + '0' * (exp - len(digits_str)) + digits_str
-            else:
-                result = digits_str[:-exp] + '.' + digits_str[-exp:]
-        
-        if sign:
-            result = '-' + result
+        return _decimal_to_string(d)
+    
+    def _checked(self, result):
+        """Map results beyond the supported range to infinity"""
+        if result.copy_abs() > _OVERFLOW:
+            return _INFINITY
         return result
     
+    def _exact(self, a, b):
+        """Whether an operation on a and b should use exact BigNumber arithmetic"""
+        return (self.exact_integers and a.is_finite() and b.is_finite()
+                and a == a.to_integral_value() and b == b.to_integral_value())
+    
     def _power(self, a, b):
         """Handle exponentiation with overflow protection"""
-        try:
-            a_dec = Decimal(a)
-            b_dec = Decimal(b)
-            
-            
-            if a_dec < 0 and b_dec != b_dec.to_integral_value():
-                raise ValueError("Negative base raised to fractional exponent results in complex number")
-            
-            
-            if abs(b_dec) > 10000 and abs(a_dec) > 1:
-                return 'inf'
-                
-            result = a_dec ** b_dec
-            
-            
-            if abs(result) > Decimal('1e1000000'):
-                return 'inf'
-                
-            return self._decimal_to_string(result)
-        except (InvalidOperation, ValueError, OverflowError) as e:
-            raise e
+        if a < 0 and b != b.to_integral_value():
+            raise ValueError("Negative base raised to fractional exponent results in complex number")
+        
+        if abs(b) > 10000 and abs(a) > 1:
+            return _INFINITY
+        
+        if b >= 0 and self._exact(a, b):
+            # |a| >= 10**a.adjusted(), so the result is known to overflow
+            # before the (possibly huge) exact power is built.
+            if a.adjusted() * int(b) > _OVERFLOW.adjusted():
+                return _INFINITY
+            return self._checked((BigNumber.from_decimal(a) ** int(b)).to_decimal())
+        
+        return self._checked(a ** b)
     
     def _divide(self, a, b):
         """Handle division with zero and overflow protection"""
-        try:
-            a_dec = Decimal(a)
-            b_dec = Decimal(b)
-            
-            if b_dec == 0:
-                raise ZeroDivisionError("Division by zero")
-                
-            result = a_dec / b_dec
-            
-            
-            if abs(result) > Decimal('1e1000000'):
-                return 'inf'
-                
-            return self._decimal_to_string(result)
-        except (InvalidOperation, ValueError, OverflowError) as e:
-            raise e
+        if b == 0:
+            raise ZeroDivisionError("Division by zero")
+        return self._checked(a / b)
     
     def _multiply(self, a, b):
         """Handle multiplication with overflow protection"""
-        try:
-            a_dec = Decimal(a)
-            b_dec = Decimal(b)
-            
-            result = a_dec * b_dec
-            
-            
-            if abs(result) > Decimal('1e1000000'):
-                return 'inf'
-                
-            return self._decimal_to_string(result)
-        except (InvalidOperation, ValueError, OverflowError) as e:
-            raise e
+        if self._exact(a, b):
+            return self._checked((BigNumber.from_decimal(a) * BigNumber.from_decimal(b)).to_decimal())
+        return self._checked(a * b)
     
     def _add(self, a, b):
         """Handle addition with overflow protection"""
-        try:
-            a_dec = Decimal(a)
-            b_dec = Decimal(b)
-            
-            result = a_dec + b_dec
-            
-            
-            if abs(result) > Decimal('1e1000000'):
-                return 'inf'
-                
-            return self._decimal_to_string(result)
-        except (InvalidOperation, ValueError, OverflowError) as e:
-            raise e
+        if self._exact(a, b):
+            return self._checked((BigNumber.from_decimal(a) + BigNumber.from_decimal(b)).to_decimal())
+        return self._checked(a + b)
     
     def _subtract(self, a, b):
         """Handle subtraction with overflow protection"""
-        try:
-            a_dec = Decimal(a)
-            b_dec = Decimal(b)
-            
-            result = a_dec - b_dec
-            
-            
-            if abs(result) > Decimal('1e1000000'):
-                return 'inf'
-                
-            return self._decimal_to_string(result)
-        except (InvalidOperation, ValueError, OverflowError) as e:
-            raise e
+        if self._exact(a, b):
+            return self._checked((BigNumber.from_decimal(a) - BigNumber.from_decimal(b)).to_decimal())
+        return self._checked(a - b)
     
     
-    def _trig(self, func, x):
-        """Handle trigonometric functions with better range checking"""
+    def _trig(self, name, x):
+        """Handle sin, cos and tan at the working precision"""
         try:
-            d = Decimal(x)
-            
-            
-            
-            
-            if abs(d) > Decimal('1e10'):
-                
-                two_pi = Decimal('2') * Decimal(str(math.pi))
-                d = d % two_pi
-            
-            
-            result = Decimal(str(func(float(d))))
-            return str(result)
+            sin, cos = _unary('sin_cos', x)
+            if name == 'sin':
+                return sin
+            if name == 'cos':
+                return cos
+            if not cos:
+                raise ValueError("Tangent undefined")
+            return sin / cos
         except Exception as e:
             raise ValueError(f"Error in trigonometric function: {str(e)}")
     
     def _sqrt(self, x):
         """Handle square root using Decimal's sqrt method"""
         try:
-            d = Decimal(x)
-            if d < 0:
+            if x < 0:
                 raise ValueError("Square root of negative number")
-            result = d.sqrt()
-            return self._decimal_to_string(result)
+            return _unary('sqrt', x)
         except Exception as e:
             raise ValueError(f"Error in sqrt function: {str(e)}")
     
     def _log(self, x):
         """Handle natural logarithm using Decimal's ln method"""
         try:
-            d = Decimal(x)
-            if d <= 0:
+            if x <= 0:
                 raise ValueError("Logarithm of non-positive number")
-            result = d.ln()
-            return self._decimal_to_string(result)
+            return _unary('ln', x)
         except Exception as e:
             raise ValueError(f"Error in log function: {str(e)}")
     
     def _log10(self, x):
         """Handle base-10 logarithm using Decimal's log10 method"""
         try:
-            d = Decimal(x)
-            if d <= 0:
+            if x <= 0:
                 raise ValueError("Logarithm of non-positive number")
-            result = d.log10()
-            return self._decimal_to_string(result)
+            return x.log10()
         except Exception as e:
             raise ValueError(f"Error in log10 function: {str(e)}")
     
     def _exp(self, x):
         """Handle exponential using Decimal's exp method"""
         try:
-            d = Decimal(x)
-            
-            if abs(d) > 1000:
+            if abs(x) > 1000:
                 raise ValueError("Exponent too large")
-            result = d.exp()
-            return self._decimal_to_string(result)
+            return _unary('exp', x)
         except Exception as e:
             raise ValueError(f"Error in exp function: {str(e)}")
     
     def _abs(self, x):
         """Handle absolute value using Decimal's abs method"""
-        try:
-            d = Decimal(x)
-            result = abs(d)
-            return self._decimal_to_string(result)
-        except Exception as e:
-            raise ValueError(f"Error in abs function: {str(e)}")
+        return abs(x)
     
     def _floor(self, x):
         """Handle floor using Decimal's to_integral_value method"""
         try:
-            d = Decimal(x)
-            result = d.to_integral_value(rounding=decimal.ROUND_FLOOR)
-            return self._decimal_to_string(result)
+            return x.to_integral_value(rounding=decimal.ROUND_FLOOR)
         except Exception as e:
             raise ValueError(f"Error in floor function: {str(e)}")
     
     def _ceil(self, x):
         """Handle ceiling using Decimal's to_integral_value method"""
         try:
-            d = Decimal(x)
-            result = d.to_integral_value(rounding=decimal.ROUND_CEILING)
-            return self._decimal_to_string(result)
+            return x.to_integral_value(rounding=decimal.ROUND_CEILING)
         except Exception as e:
             raise ValueError(f"Error in ceil function: {str(e)}")
     
     def _round(self, x):
         """Handle rounding using Decimal's to_integral_value method"""
         try:
-            d = Decimal(x)
-            result = d.to_integral_value(rounding=decimal.ROUND_HALF_UP)
-            return self._decimal_to_string(result)
+            return x.to_integral_value(rounding=decimal.ROUND_HALF_UP)
         except Exception as e:
             raise ValueError(f"Error in round function: {str(e)}")
 
-def solve_expression(expression, show_steps=False):
-    """Main function to solve the expression with error handling"""
-    evaluator = ExpressionEvaluator()
+def _pool_worker(conn):
+    """Worker process loop for EvaluationPool"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        expression, show_steps, precision, adaptive, variables, cpu_time, max_steps = task
+        
+        limits = None
+        if cpu_time and resource is not None:
+            limits = resource.getrlimit(resource.RLIMIT_CPU)
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            soft = math.ceil(usage.ru_utime + usage.ru_stime + cpu_time)
+            if limits[1] != resource.RLIM_INFINITY:
+                soft = min(soft, limits[1])
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, limits[1]))
+        
+        evaluator = ExpressionEvaluator(precision=precision, adaptive=adaptive)
+        evaluator.variables = variables
+        result = evaluator.evaluate(expression, show_steps, max_steps=max_steps)
+        
+        if limits is not None:
+            resource.setrlimit(resource.RLIMIT_CPU, limits)
+        conn.send(result)
+
+
+class _PoolWorker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_pool_worker, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+
+
+class EvaluationPool:
+    """Bounded pool of worker processes for expensive evaluations.
+
+    At most `max_workers` evaluations run at once; further callers wait for
+    a free worker, and the wait counts against their wall-time budget. Each evaluation gets a wall-time budget, an optional CPU
+    time budget (enforced with RLIMIT_CPU where the platform has it) and
+    can be cancelled through a threading.Event. A worker that overruns or
+    is cancelled is killed and replaced on the next call, so a runaway
+    Decimal operation never outlives its budget. Errors are reported as
+    "Error: ..." strings like ExpressionEvaluator.evaluate().
+    """
+
+    def __init__(self, max_workers=2, offload_cost=DEFAULT_OFFLOAD_COST, wall_time=10.0, cpu_time=None):
+        self.max_workers = max_workers
+        self.offload_cost = offload_cost
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        # Workers are started from a clean server process rather than
+        # forked from the caller, which may be multithreaded: a fork taken
+        # while another thread holds a lock (expression_cache's, say)
+        # leaves the worker waiting on it forever.
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def run(self, expression, show_steps=False, precision=DEFAULT_PRECISION, adaptive=False,
+            variables=None, wall_time=None, cpu_time=None, cancel=None, max_steps=None):
+        """Evaluate an expression in a worker process, blocking until it finishes"""
+        wall_time = self.wall_time if wall_time is None else wall_time
+        cpu_time = self.cpu_time if cpu_time is None else cpu_time
+        task = (expression, show_steps, precision, adaptive, dict(variables or {}), cpu_time, max_steps)
+        deadline = time.monotonic() + wall_time if wall_time else None
+        
+        # Waiting for a free worker counts against the budget, and a caller
+        # that gives up while waiting leaves the workers alone.
+        while True:
+            if cancel is not None and cancel.is_set():
+                return "Error: Evaluation cancelled"
+            wait = 0.05
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return "Error: Evaluation timed out"
+                wait = min(wait, remaining)
+            if self._slots.acquire(timeout=wait):
+                break
+        
+        try:
+            worker = self._checkout()
+            worker.conn.send(task)
+            
+            while True:
+                if cancel is not None and cancel.is_set():
+                    worker.kill()
+                    return "Error: Evaluation cancelled"
+                
+                wait = 0.05
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        worker.kill()
+                        return "Error: Evaluation timed out"
+                    wait = min(wait, remaining)
+                
+                if worker.conn.poll(wait):
+                    try:
+                        result = worker.conn.recv()
+                    except (EOFError, ConnectionError):
+                        worker.kill()
+                        if worker.process.exitcode == -getattr(signal, 'SIGXCPU', 0):
+                            return "Error: Evaluation exceeded its CPU time budget"
+                        return "Error: Evaluation worker stopped unexpectedly"
+                    self._checkin(worker)
+                    return result
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        """Stop all idle workers"""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.close()
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.close()
+        return _PoolWorker(self._ctx)
+
+    def _checkin(self, worker):
+        with self._lock:
+            self._idle.append(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def solve_expression(expression, show_steps=False, cache=None,
+                     precision=DEFAULT_PRECISION, adaptive=False,
+                     pool=None, wall_time=None, cpu_time=None):
+    """Main function to solve the expression with error handling.
+
+    With a `pool`, expressions whose estimated cost exceeds
+    pool.offload_cost run in one of its worker processes under the given
+    time budgets; everything else is evaluated in-process.
+    """
+    evaluator = ExpressionEvaluator(cache=cache, precision=precision, adaptive=adaptive)
+    if pool is not None and evaluator.estimate_cost(expression) > pool.offload_cost:
+        return pool.run(expression, show_steps, precision, adaptive,
+                        wall_time=wall_time, cpu_time=cpu_time)
     return evaluator.evaluate(expression, show_steps)
 
 def main():
     """Main function to interact with the user"""
-    global sbse
-    
     evaluator = ExpressionEvaluator()
     
     print("Expression Evaluator")
@@ -733,12 +1734,14 @@ def main():
         
         if isinstance(result, dict):
             print("Result:", result["result"])
+            steps = result["steps"]
         else:
             print("Result:", result)
+            steps = []
         
         
         print("\nStep-by-step evaluation:")
-        for i, step in enumerate(sbse, 1):
+        for i, step in enumerate(steps, 1):
             print(f"{i}. {step}")
 
 if __name__ == "__main__":